@@ -0,0 +1,140 @@
+import logging
+import shutil
+import tempfile
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from bson.objectid import ObjectId
+from database.models import BiometricJob
+from controllers.user_controller import UserController
+from settings import settings
+from utils.exceptions import BiometricJobNotFound, BiometricsBusy, BiometricsNotValid, biometric_error_status
+from utils.http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BiometricJobController:
+    """Validações biométricas assíncronas.
+
+    O job é registrado no Mongo (com expiração por TTL) e executado num pool
+    de threads local, que por sua vez espera uma vaga no pool biométrico. A
+    imagem de um job pendente fica num arquivo temporário em disco até ele
+    rodar. O resultado é consultado por polling ou enviado ao callback_url
+    informado. Jobs pendentes de um processo que reiniciou não são retomados
+    e expiram.
+
+    Com BIOMETRIC_ASYNC_WORKERS=0 o job roda na própria requisição.
+    """
+    EXECUTOR = None
+    SLOTS = None
+    LOCK = threading.Lock()
+
+    @staticmethod
+    def executor():
+        with BiometricJobController.LOCK:
+            if BiometricJobController.EXECUTOR is None:
+                BiometricJobController.EXECUTOR = ThreadPoolExecutor(
+                    max_workers=settings.BIOMETRIC_ASYNC_WORKERS,
+                    thread_name_prefix="biometric-job"
+                )
+                BiometricJobController.SLOTS = threading.BoundedSemaphore(settings.BIOMETRIC_ASYNC_MAX_PENDING)
+            return BiometricJobController.EXECUTOR
+
+    @staticmethod
+    def callback_allowed(callback_url):
+        parts = urlsplit(callback_url)
+        return parts.scheme in ("http", "https") and parts.hostname in settings.BIOMETRIC_CALLBACK_ALLOWED_HOSTS
+
+    @staticmethod
+    def _spool(image):
+        image_file = tempfile.TemporaryFile()
+        try:
+            shutil.copyfileobj(image, image_file)
+            image_file.seek(0)
+        except Exception:
+            image_file.close()
+            raise
+        return image_file
+
+    @staticmethod
+    def submit(image, user_id, is_from_partner, callback_url=None):
+        job_id = BiometricJob(user_id, is_from_partner, callback_url).save()
+
+        if settings.BIOMETRIC_ASYNC_WORKERS <= 0:
+            BiometricJobController.run(job_id, image, user_id, is_from_partner, callback_url)
+            return job_id
+
+        executor = BiometricJobController.executor()
+        slots = BiometricJobController.SLOTS
+        if not slots.acquire(blocking=False):
+            BiometricJob.update(job_id, {"state": "failed", "error": {"status": 503, "message": "Fila de jobs cheia"}})
+            raise BiometricsBusy("Serviço de biometria ocupado, tente novamente.")
+        image_file = None
+        try:
+            image_file = BiometricJobController._spool(image)
+            future = executor.submit(BiometricJobController.run, job_id, image_file, user_id, is_from_partner, callback_url)
+        except Exception:
+            if image_file is not None:
+                image_file.close()
+            slots.release()
+            raise
+
+        def done(_):
+            image_file.close()
+            slots.release()
+
+        future.add_done_callback(done)
+        return job_id
+
+    @staticmethod
+    def run(job_id, image, user_id, is_from_partner, callback_url=None):
+        BiometricJob.update(job_id, {"state": "running"})
+        try:
+            # O job já está na fila; espera uma vaga no pool biométrico em vez
+            # de falhar com 503 como uma requisição interativa.
+            UserController.validate_biometrics(image, user_id, is_from_partner, blocking=True)
+            values = {"state": "done", "result": {"valid": True}}
+        except BiometricsNotValid:
+            values = {"state": "done", "result": {"valid": False}}
+        except Exception as e:
+            logger.error(f"Error: job {job_id}: {str(e)}")
+            values = {"state": "failed", "error": {"status": biometric_error_status(e), "message": str(e)}}
+        BiometricJob.update(job_id, values)
+
+        if callback_url:
+            BiometricJobController.notify(job_id, callback_url)
+
+    @staticmethod
+    def notify(job_id, callback_url):
+        job = BiometricJobController.find_job(job_id)
+        try:
+            # O host do callback foi validado, o destino de um redirecionamento
+            # não; um 3xx conta como falha na entrega.
+            response = HttpClient.post(callback_url, json=job, allow_redirects=False)
+            if 300 <= response.status_code < 400:
+                raise requests.HTTPError(f"Redirecionamento {response.status_code} não permitido", response=response)
+            response.raise_for_status()
+            BiometricJob.update(job_id, {"callback": "delivered"})
+        except requests.RequestException as e:
+            logger.error(f"Não foi possível notificar o callback do job {job_id}: {e}")
+            BiometricJob.update(job_id, {"callback": "failed"})
+
+    @staticmethod
+    def find_job(job_id):
+        job = BiometricJob.find_by_id(job_id) if ObjectId.is_valid(job_id) else None
+        if not job:
+            raise BiometricJobNotFound("Job não encontrado.")
+
+        return {
+            "job_id": str(job["_id"]),
+            "user_id": job["user_id"],
+            "state": job["state"],
+            "result": job.get("result"),
+            "error": job.get("error"),
+            "callback": job.get("callback"),
+            "created_at": job["created_at"].isoformat(),
+            "updated_at": job["updated_at"].isoformat(),
+        }
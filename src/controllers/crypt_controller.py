@@ -1,17 +1,24 @@
+import base64
 import logging
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
 from settings import settings
-from utils.exceptions import CryptoException
+from utils.exceptions import CryptoBatchException, CryptoException
+from utils.cache import TTLCache
+from utils.http_client import HttpClient
 
 headers = {"Content-Type": "application/json"}
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-class CryptController:
+class RemoteCryptBackend:
     @staticmethod
     def encrypt(message):
-        
+
         payload = {
             "message": message,
             "public_key": settings.CRYPTO_PUBLIC_KEY
@@ -19,7 +26,11 @@ class CryptController:
 
         url = f"{settings.CRYPTO_URL}/rsa/encrypt"
 
-        response = requests.post(url, json=payload, headers=headers)
+        try:
+            response = HttpClient.post(url, json=payload, headers=headers)
+        except requests.RequestException as e:
+            logger.error(f"Não foi possível comunicar com o servidor de criptografia: {e}")
+            raise CryptoException("Não foi possível comunicar com o servidor de criptografia")
 
         if response.status_code == 422:
             logger.info(f"Resposta do crypto: {response.text}")
@@ -39,7 +50,7 @@ class CryptController:
         else:
             logger.error("Não foi possível comunicar com o servidor de criptografia")
             raise CryptoException("Não foi possível comunicar com o servidor de criptografia")
-        
+
     @staticmethod
     def decrypt(message):
         payload = {
@@ -49,7 +60,11 @@ class CryptController:
 
         url = f"{settings.CRYPTO_URL}/rsa/decrypt"
 
-        response = requests.post(url, json=payload, headers=headers)
+        try:
+            response = HttpClient.post(url, json=payload, headers=headers)
+        except requests.RequestException as e:
+            logger.error(f"Não foi possível comunicar com o servidor de criptografia: {e}")
+            raise CryptoException("Não foi possível comunicar com o servidor de criptografia")
 
         if response.status_code == 422:
             return None
@@ -68,3 +83,142 @@ class CryptController:
         else:
             logger.error("Não foi possível comunicar com o servidor de criptografia")
             raise CryptoException("Não foi possível comunicar com o servidor de criptografia")
+
+
+class LocalCryptBackend:
+    """Criptografia RSA-OAEP em processo, no mesmo formato do serviço remoto
+    (mensagem UTF-8 cifrada e codificada em base64).
+
+    As chaves PEM de CRYPTO_PUBLIC_KEY/CRYPTO_PRIVATE_KEY são carregadas uma
+    única vez e reaproveitadas entre as requisições.
+    """
+    KEYS = {}
+
+    @staticmethod
+    def _load_key(name):
+        pem = getattr(settings, name)
+        if (name, pem) not in LocalCryptBackend.KEYS:
+            pem_bytes = pem.replace("\\n", "\n").encode("utf-8")
+            try:
+                if name == "CRYPTO_PUBLIC_KEY":
+                    key = serialization.load_pem_public_key(pem_bytes)
+                else:
+                    key = serialization.load_pem_private_key(pem_bytes, password=None)
+            except ValueError as e:
+                logger.error(f"Chave de criptografia inválida: {name}")
+                raise CryptoException(f"Chave de criptografia inválida: {name}: {e}")
+            LocalCryptBackend.KEYS[(name, pem)] = key
+        return LocalCryptBackend.KEYS[(name, pem)]
+
+    @staticmethod
+    def _padding():
+        algorithm = getattr(hashes, settings.CRYPTO_OAEP_HASH.upper())()
+        return padding.OAEP(mgf=padding.MGF1(algorithm=algorithm), algorithm=algorithm, label=None)
+
+    @staticmethod
+    def encrypt(message):
+        if not message:
+            return None
+        public_key = LocalCryptBackend._load_key("CRYPTO_PUBLIC_KEY")
+        try:
+            encrypted = public_key.encrypt(message.encode("utf-8"), LocalCryptBackend._padding())
+        except ValueError as e:
+            logger.error(f"Erro ao criptografar localmente: {e}")
+            raise CryptoException(f"Erro ao criptografar localmente: {e}")
+        return base64.b64encode(encrypted).decode("utf-8")
+
+    @staticmethod
+    def decrypt(message):
+        if not message:
+            return None
+        private_key = LocalCryptBackend._load_key("CRYPTO_PRIVATE_KEY")
+        try:
+            decrypted = private_key.decrypt(base64.b64decode(message), LocalCryptBackend._padding())
+        except ValueError:
+            logger.info("Mensagem criptografada inválida")
+            return None
+        return decrypted.decode("utf-8")
+
+
+CRYPT_BACKENDS = {
+    "remote": RemoteCryptBackend,
+    "local": LocalCryptBackend,
+}
+
+
+class CryptController:
+    EXECUTOR = None
+    EXECUTOR_LOCK = threading.Lock()
+    DECRYPT_CACHE = TTLCache(settings.DECRYPT_CACHE_MAX_SIZE, settings.DECRYPT_CACHE_TTL)
+
+    @staticmethod
+    def backend():
+        backend = CRYPT_BACKENDS.get(settings.CRYPTO_BACKEND)
+        if not backend:
+            raise CryptoException(f"Backend de criptografia desconhecido: {settings.CRYPTO_BACKEND}")
+        return backend
+
+    @staticmethod
+    def encrypt(message):
+        return CryptController.backend().encrypt(message)
+
+    @staticmethod
+    def decrypt(message, use_cache=True):
+        if not use_cache or not settings.DECRYPT_CACHE_ENABLED:
+            return CryptController.backend().decrypt(message)
+        decrypted_message = CryptController.DECRYPT_CACHE.get(message)
+        if decrypted_message is None:
+            decrypted_message = CryptController.backend().decrypt(message)
+            CryptController.DECRYPT_CACHE.set(message, decrypted_message)
+        return decrypted_message
+
+    @staticmethod
+    def clear_decrypt_cache():
+        CryptController.DECRYPT_CACHE.clear()
+        logger.info("Cache de descriptografia limpo.")
+
+    @staticmethod
+    def decrypt_cache_stats():
+        return CryptController.DECRYPT_CACHE.stats()
+
+    @staticmethod
+    def encrypt_many(messages):
+        return CryptController._run_many(CryptController.encrypt, messages)
+
+    @staticmethod
+    def decrypt_many(messages):
+        return CryptController._run_many(CryptController.decrypt, messages)
+
+    @staticmethod
+    def _executor():
+        with CryptController.EXECUTOR_LOCK:
+            if CryptController.EXECUTOR is None:
+                CryptController.EXECUTOR = ThreadPoolExecutor(
+                    max_workers=settings.CRYPTO_MAX_CONCURRENCY,
+                    thread_name_prefix="crypto"
+                )
+        return CryptController.EXECUTOR
+
+    @staticmethod
+    def _run_many(operation, messages):
+        results = [None] * len(messages)
+        pending = [index for index, message in enumerate(messages) if message is not None]
+        errors = {}
+
+        if settings.CRYPTO_BACKEND == "remote" and len(pending) > 1:
+            executor = CryptController._executor()
+            futures = {index: executor.submit(operation, messages[index]) for index in pending}
+            resolve = lambda index: futures[index].result()
+        else:
+            resolve = lambda index: operation(messages[index])
+
+        for index in pending:
+            try:
+                results[index] = resolve(index)
+            except Exception as e:
+                errors[index] = str(e)
+
+        if errors:
+            logger.error(f"Erro ao processar lote de criptografia: {errors}")
+            raise CryptoBatchException(errors)
+        return results
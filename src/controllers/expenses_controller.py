@@ -3,6 +3,7 @@ import requests
 from datetime import datetime
 from settings import settings
 from utils.exceptions import ExpensesException
+from utils.http_client import HttpClient
 
 headers = {"Content-Type": "application/json"}
 
@@ -21,7 +22,7 @@ class ExpensesController:
         url = f"{settings.EXPENSES_API}/auth"
 
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=2)
+            response = HttpClient.post(url, json=payload, headers=headers, timeout=2)
         except requests.Timeout:
             logger.error("Não foi possível comunicar com o servidor de despesas")
             return
@@ -41,7 +42,7 @@ class ExpensesController:
         url = f"{settings.EXPENSES_API}/user/register"
 
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=2)
+            response = HttpClient.post(url, json=payload, headers=headers, timeout=2)
         except requests.Timeout:
             logger.error("Não foi possível comunicar com o servidor de despesas")
             return
@@ -68,7 +69,11 @@ class ExpensesController:
 
         url = f"{settings.EXPENSES_API}/budget/v1/revenue/create/{user_external_id}/"
 
-        response = requests.post(url, json=payload, headers=headers)
+        try:
+            response = HttpClient.post(url, json=payload, headers=headers)
+        except requests.RequestException as e:
+            logger.error(f"Não foi possível comunicar com o servidor de despesas: {e}")
+            raise ExpensesException("Não foi possível comunicar com o servidor de despesas")
 
         logger.info(f"Resposta do servidor de despesas: {response.status_code}")
 
@@ -82,7 +87,11 @@ class ExpensesController:
     def list_expenses(user_external_id):
         url = f"{settings.EXPENSES_API}/budget/v1/revenue/list/{user_external_id}/"
 
-        response = requests.get(url, headers=headers)
+        try:
+            response = HttpClient.get(url, headers=headers)
+        except requests.RequestException as e:
+            logger.error(f"Não foi possível comunicar com o servidor de despesas: {e}")
+            raise ExpensesException("Não foi possível comunicar com o servidor de despesas")
 
         logger.info(f"Resposta do servidor de despesas: {response.status_code}")
 
@@ -96,7 +105,11 @@ class ExpensesController:
     def list_expenses_categories():
         url = f"{settings.EXPENSES_API}/budget/v1/revenue/list-categories/"
 
-        response = requests.get(url, headers=headers)
+        try:
+            response = HttpClient.get(url, headers=headers)
+        except requests.RequestException as e:
+            logger.error(f"Não foi possível comunicar com o servidor de despesas: {e}")
+            raise ExpensesException("Não foi possível comunicar com o servidor de despesas")
 
         logger.info(f"Resposta do servidor de despesas: {response.status_code}")
 
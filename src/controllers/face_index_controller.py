@@ -0,0 +1,231 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from database.models import PartnerBiometrics
+from settings import settings
+from utils.face_index import EmbeddingDeltaLog, IVFFaceIndex
+from utils.face_recog import deserialize_encoding
+from utils.index import default_datetime
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class FaceIndexController:
+    """Mantém o índice facial dos parceiros deste processo.
+
+    O snapshot em FACE_INDEX_PATH é mapeado em memória só para leitura, então
+    os workers compartilham as mesmas páginas. Cadastros novos vão para o log
+    de deltas do snapshot atual, que cada worker relê a partir do último
+    offset. O Mongo é consultado ao carregar, para as biometrias posteriores
+    ao início da varredura que gerou o snapshot, e depois a cada
+    FACE_INDEX_REFRESH_SECONDS, em lotes de até FACE_INDEX_SYNC_BATCH, para
+    os cadastros feitos em outros hosts.
+
+    Cada snapshot começa com um log vazio. Quando as inserções posteriores ao
+    snapshot passam de FACE_INDEX_COMPACT_AFTER, uma thread grava um snapshot
+    novo, e os workers o carregam na próxima busca. Registros gravados no log
+    da geração anterior durante a troca são cobertos pela consulta ao Mongo
+    na carga.
+    """
+    INDEX = None
+    SNAPSHOT = None
+    TAIL_IDS = set()
+    LOCK = threading.RLock()
+    REFRESHED_AT = 0.0
+    CATCH_UP_SINCE = None
+    LOADED_TAIL = 0
+    COMPACTION = None
+
+    @staticmethod
+    def _path(name):
+        return os.path.join(settings.FACE_INDEX_PATH, name)
+
+    @staticmethod
+    def _delta_log(snapshot):
+        return EmbeddingDeltaLog(os.path.join(settings.FACE_INDEX_PATH, snapshot, "delta.log"))
+
+    @staticmethod
+    def _new_index():
+        return IVFFaceIndex(
+            n_lists=settings.FACE_INDEX_LISTS,
+            n_probe=settings.FACE_INDEX_PROBES,
+            min_train=settings.FACE_INDEX_MIN_TRAIN
+        )
+
+    @staticmethod
+    def _add(index, ids, vectors, seen):
+        # Só as inserções posteriores ao snapshot são deduplicadas aqui; um id
+        # repetido em relação ao snapshot é descartado na busca.
+        new_ids = []
+        new_vectors = []
+        for user_id, vector in zip(ids, vectors):
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            new_ids.append(user_id)
+            new_vectors.append(vector)
+        if new_ids:
+            index.add(new_ids, new_vectors)
+        return len(new_ids)
+
+    @staticmethod
+    def _add_rows(index, rows, seen):
+        ids = []
+        vectors = []
+        for row in rows:
+            encoding = deserialize_encoding(row.get("face_encoding"))
+            if encoding is None:
+                continue
+            ids.append(str(row["user_id"]))
+            vectors.append(encoding)
+            created_at = row.get("created_at")
+            if created_at and (index.synced_at is None or created_at > index.synced_at):
+                index.synced_at = created_at
+        return FaceIndexController._add(index, ids, vectors, seen)
+
+    @staticmethod
+    def rebuild(if_missing=False, replaces=None):
+        """Grava um novo snapshot a partir do Mongo. Com `if_missing=True`
+        (primeira carga) não faz nada se outro processo já gravou um
+        snapshot enquanto este esperava o lock; com `replaces` (compactação),
+        não faz nada se o snapshot atual já não for o informado."""
+        os.makedirs(settings.FACE_INDEX_PATH, exist_ok=True)
+        with open(FaceIndexController._path("rebuild.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            current = IVFFaceIndex.current_snapshot(settings.FACE_INDEX_PATH)
+            if if_missing and current is not None:
+                return 0
+            if replaces is not None and current != replaces:
+                return 0
+            # Cadastros feitos depois do início da varredura podem ter ido
+            # para o log da geração anterior; a carga os busca no Mongo a
+            # partir deste instante.
+            # O Mongo devolve created_at em UTC sem fuso; synced_at segue
+            # o mesmo formato para poder ser comparado.
+            started_at = default_datetime().replace(tzinfo=None)
+            index = FaceIndexController._new_index()
+            added = FaceIndexController._add_rows(index, PartnerBiometrics.find_face_encodings(), set())
+            index.synced_at = started_at
+            index.save(settings.FACE_INDEX_PATH)
+            logger.info(f"Índice facial reconstruído com {added} codificações.")
+            return added
+
+    @staticmethod
+    def _compact(snapshot):
+        try:
+            FaceIndexController.rebuild(replaces=snapshot)
+        except Exception as e:
+            logger.error(f"Erro ao compactar o índice facial: {e}")
+
+    @staticmethod
+    def _start_compaction(index):
+        compaction = FaceIndexController.COMPACTION
+        if compaction is not None and compaction.is_alive():
+            return
+        logger.info(f"Compactando o índice facial com {len(index.tail_ids)} inserções após o snapshot {index.snapshot}.")
+        FaceIndexController.COMPACTION = threading.Thread(
+            target=FaceIndexController._compact, args=(index.snapshot,), daemon=True
+        )
+        FaceIndexController.COMPACTION.start()
+
+    @staticmethod
+    def _load():
+        if IVFFaceIndex.current_snapshot(settings.FACE_INDEX_PATH) is None:
+            FaceIndexController.rebuild(if_missing=True)
+
+        FaceIndexController.TAIL_IDS = set()
+        index = IVFFaceIndex.load(
+            settings.FACE_INDEX_PATH,
+            n_probe=settings.FACE_INDEX_PROBES,
+            min_train=settings.FACE_INDEX_MIN_TRAIN
+        )
+        FaceIndexController.SNAPSHOT = index.snapshot
+        FaceIndexController.INDEX = index
+        FaceIndexController.CATCH_UP_SINCE = None
+        FaceIndexController.REFRESHED_AT = time.monotonic()
+
+        if index.synced_at is not None:
+            # Cobre cadastros que chegaram ao Mongo mas não ao log desta
+            # geração (outro host, ou gravados durante a reconstrução).
+            since = index.synced_at - timedelta(seconds=settings.FACE_INDEX_SYNC_OVERLAP)
+            FaceIndexController._add_rows(
+                index, PartnerBiometrics.find_face_encodings(since=since), FaceIndexController.TAIL_IDS
+            )
+        # A sobreposição da carga relê cadastros que já estão no snapshot;
+        # eles não contam para a compactação, senão ela se repetiria.
+        FaceIndexController.LOADED_TAIL = len(index.tail_ids)
+        FaceIndexController._replay_delta_log()
+        logger.info(f"Índice facial carregado com {index.size} codificações.")
+
+    @staticmethod
+    def _replay_delta_log():
+        index = FaceIndexController.INDEX
+        delta_log = FaceIndexController._delta_log(index.snapshot)
+        ids, vectors, index.delta_offset = delta_log.read_from(index.delta_offset)
+        return FaceIndexController._add(index, ids, vectors, FaceIndexController.TAIL_IDS)
+
+    @staticmethod
+    def _refresh():
+        index = FaceIndexController.INDEX
+        now = time.monotonic()
+        if index.synced_at is None or now - FaceIndexController.REFRESHED_AT < settings.FACE_INDEX_REFRESH_SECONDS:
+            return 0
+        FaceIndexController.REFRESHED_AT = now
+        since = FaceIndexController.CATCH_UP_SINCE
+        if since is None:
+            since = index.synced_at - timedelta(seconds=settings.FACE_INDEX_SYNC_OVERLAP)
+        rows = list(PartnerBiometrics.find_face_encodings(since=since, limit=settings.FACE_INDEX_SYNC_BATCH))
+        added = FaceIndexController._add_rows(index, rows, FaceIndexController.TAIL_IDS)
+        # Lote cheio: a próxima consulta continua do último created_at, sem
+        # a sobreposição, para não reler sempre o mesmo lote.
+        if len(rows) >= settings.FACE_INDEX_SYNC_BATCH:
+            FaceIndexController.CATCH_UP_SINCE = rows[-1]["created_at"]
+        else:
+            FaceIndexController.CATCH_UP_SINCE = None
+        return added
+
+    @staticmethod
+    def index():
+        with FaceIndexController.LOCK:
+            snapshot = IVFFaceIndex.current_snapshot(settings.FACE_INDEX_PATH)
+            if FaceIndexController.INDEX is None or snapshot != FaceIndexController.SNAPSHOT:
+                FaceIndexController._load()
+            else:
+                FaceIndexController._replay_delta_log()
+                FaceIndexController._refresh()
+            index = FaceIndexController.INDEX
+            if 0 < settings.FACE_INDEX_COMPACT_AFTER <= len(index.tail_ids) - FaceIndexController.LOADED_TAIL:
+                FaceIndexController._start_compaction(index)
+            return index
+
+    @staticmethod
+    def add(user_id, face_encoding):
+        encoding = deserialize_encoding(face_encoding)
+        snapshot = IVFFaceIndex.current_snapshot(settings.FACE_INDEX_PATH)
+        # Sem snapshot, a primeira carga lê tudo do Mongo.
+        if encoding is None or snapshot is None:
+            return
+        try:
+            FaceIndexController._delta_log(snapshot).append(user_id, encoding)
+        except OSError as e:
+            # O snapshot pode ter sido removido entre a leitura do link e a
+            # gravação; o cadastro já está no Mongo e entra na próxima carga.
+            logger.warning(f"Não foi possível gravar no log de deltas: {e}")
+
+    @staticmethod
+    def search(probe_encoding, top_k):
+        return FaceIndexController.index().search(probe_encoding, top_k)
+
+    @staticmethod
+    def reset():
+        with FaceIndexController.LOCK:
+            FaceIndexController.INDEX = None
+            FaceIndexController.SNAPSHOT = None
+            FaceIndexController.TAIL_IDS = set()
+            FaceIndexController.REFRESHED_AT = 0.0
+            FaceIndexController.CATCH_UP_SINCE = None
+            FaceIndexController.LOADED_TAIL = 0
@@ -1,54 +1,54 @@
 import logging
+import numpy as np
+from itertools import islice
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from database.models import PartnerBiometrics, User, Document
 from controllers.crypt_controller import CryptController
 from controllers.expenses_controller import ExpensesController
-from utils.index import generate_random_password
-from utils.exceptions import BiometricsNotFound, UserAlreadyExistsException, LoginException, UserNotFound, BiometricsNotValid
-from utils.face_recog import ValidateBiometric
+from controllers.face_index_controller import FaceIndexController
+from settings import settings
+from utils.cache import TTLCache
+from utils.index import blind_index, check_password, file_bytes, generate_random_password, hash_password, is_password_hash, normalize_document, normalize_email
+from utils.exceptions import BiometricsNotFound, DocumentNotFound, FaceNotDetected, UserAlreadyExistsException, LoginException, UserNotFound, BiometricsNotValid
+from utils.biometric_engine import BiometricEngine, encode_face, validate_faces
+from utils.face_recog import deserialize_encoding, probe_cache_key, serialize_encoding
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 class UserController:
+    REFERENCE_CACHE = TTLCache(settings.REFERENCE_CACHE_MAX_SIZE, settings.REFERENCE_CACHE_TTL)
+    PROBE_CACHE = TTLCache(settings.PROBE_CACHE_MAX_SIZE, settings.PROBE_CACHE_TTL)
+    CRYPTED_FIELDS = ("cpf", "cnpj", "email")
+    USER_FIELDS = (
+        "name", "email", "cpf", "cnpj", "cellphone", "currency", "balance", "agency",
+        "institution", "account", "external_id", "documents", "created_at", "updated_at"
+    )
+
     @staticmethod
     def create_user(user):
         email = user["email"]
         cpf = user.get("cpf", None)
         cnpj = user.get("cnpj", None)
-        has_email = False
-        has_cpf = False
-        has_cnpj = False
-        users = User.find()
-
-        crypted_email = CryptController.encrypt(email)
-        crypted_cpf = CryptController.encrypt(cpf)
-        crypted_cnpj = CryptController.encrypt(cnpj)
-        crypted_password = CryptController.encrypt(user["password"])
-
-        for existent_user in users:
-            decrypt_email = CryptController.decrypt(existent_user.get("email", None))
-            decrypt_cpf = CryptController.decrypt(existent_user.get("cpf", None))
-            decrypt_cnpj = CryptController.decrypt(existent_user.get("cnpj", None))
-            if email and email == decrypt_email:
-                has_email = True
-                break
-            if cpf and cpf == decrypt_cpf:
-                has_cpf = True
-                break
-            if cnpj and cnpj == decrypt_cnpj:
-                has_cnpj = True
-                break
 
-        if has_email:
+        email_index = blind_index(email, normalize_email)
+        cpf_index = blind_index(cpf, normalize_document)
+        cnpj_index = blind_index(cnpj, normalize_document)
+
+        if User.find_by_blind_index("email", email_index):
             logger.error("Email já está cadastrado")
             raise UserAlreadyExistsException("Email já está cadastrado")
-        if has_cpf:
+        if cpf_index and User.find_by_blind_index("cpf", cpf_index):
             logger.error("CPF já está cadastrado")
             raise UserAlreadyExistsException("CPF já está cadastrado")
-        if has_cnpj:
+        if cnpj_index and User.find_by_blind_index("cnpj", cnpj_index):
             logger.error("CNPJ já está cadastrado")
             raise UserAlreadyExistsException("CNPJ já está cadastrado")
-            
+
+        crypted_email, crypted_cpf, crypted_cnpj = CryptController.encrypt_many([email, cpf, cnpj])
+        password_hash = hash_password(user["password"])
+
         ExpensesController.auth()
         integration_password = generate_random_password()
         external_id = ExpensesController.register(email, integration_password)
@@ -64,75 +64,132 @@ class UserController:
             agency=user.get("agency"),
             institution=user.get("institution"),
             account=user.get("account"),
-            password=crypted_password,
-            external_id=external_id
+            password=password_hash,
+            external_id=external_id,
+            email_index=email_index,
+            cpf_index=cpf_index,
+            cnpj_index=cnpj_index
         )
-        user_id = new_user.save()
+        try:
+            user_id = new_user.save()
+        except DuplicateKeyError:
+            logger.error("Usuário já está cadastrado")
+            raise UserAlreadyExistsException("Usuário já está cadastrado")
         logger.info(f"Usuário criado com sucesso. {user_id}")
         return user_id
 
     @staticmethod
     def login(user_login):
-        users = User.find()
-        login = []
-        for existent_user in users:
-            decrypt_email = CryptController.decrypt(existent_user.get("email", None))
-            decrypt_cpf = CryptController.decrypt(existent_user.get("cpf", None))
-            decrypt_cnpj = CryptController.decrypt(existent_user.get("cnpj", None))
-            decrypt_password = CryptController.decrypt(existent_user.get("password"))
-            user_dict = {
-                "email": decrypt_email,
-                "cpf": decrypt_cpf,
-                "cnpj": decrypt_cnpj,
-                "password": decrypt_password,
-                "user_id": existent_user.get("_id")
-            }
-            login.append(user_dict)
         if user_login.get("email"):
             field = "email"
-            user = UserController.field_in_list(login, field, user_login.get("email"))
+            value_index = blind_index(user_login.get("email"), normalize_email)
         elif user_login.get("cpf"):
             field = "cpf"
-            user = UserController.field_in_list(login, field, user_login.get("cpf"))
+            value_index = blind_index(user_login.get("cpf"), normalize_document)
         else:
             field = "cnpj"
-            user = UserController.field_in_list(login, field, user_login.get("cnpj"))
+            value_index = blind_index(user_login.get("cnpj"), normalize_document)
+
+        user = User.find_by_blind_index(field, value_index)
         if not user:
             logger.error("Usuário ou senha inválido")
             raise LoginException("Usuário ou senha inválido")
-        if user["password"] == user_login["password"]:
-            return user["user_id"]
-        else:
+        if not UserController.check_user_password(user, user_login["password"]):
             logger.error("Usuário ou senha inválido")
             raise LoginException("Usuário ou senha inválido")
-        
+        return user["_id"]
+
     @staticmethod
-    def field_in_list(list, field, field_value):
-        for dict in list:
-            if dict.get(field) == field_value:
-                return dict
-        return
+    def check_user_password(user, password):
+        stored_password = user.get("password")
+        if is_password_hash(stored_password):
+            return check_password(password, stored_password)
+
+        # Senhas antigas foram salvas com o serviço de criptografia; no
+        # primeiro login válido elas são substituídas pelo hash bcrypt.
+        if CryptController.decrypt(stored_password, use_cache=False) != password:
+            return False
+        User.update_password(user["_id"], hash_password(password))
+        logger.info(f"Senha migrada para bcrypt. {user['_id']}")
+        return True
+
+    @staticmethod
+    def backfill_blind_indexes():
+        updated = 0
+        for existent_user in User.find_without_blind_index():
+            decrypt_email, decrypt_cpf, decrypt_cnpj = CryptController.decrypt_many(
+                [existent_user.get("email", None), existent_user.get("cpf", None), existent_user.get("cnpj", None)]
+            )
+            indexes = {
+                "email_index": blind_index(decrypt_email, normalize_email),
+                "cpf_index": blind_index(decrypt_cpf, normalize_document),
+                "cnpj_index": blind_index(decrypt_cnpj, normalize_document)
+            }
+            updated += User.update_blind_index(existent_user["_id"], indexes)
+        logger.info(f"Índices cegos atualizados. {updated}")
+        return updated
         
     @staticmethod
-    def find_user_by_id(user_id):
-        user = User.find_by_id(user_id)
+    def migrate_embedded_documents():
+        migrated = 0
+        for user in Document.find_users_with_embedded_files():
+            manifest = []
+            for document in user["documents"]:
+                if "file" not in document:
+                    manifest.append(document)
+                    continue
+                new_document = Document(
+                    document_type=document["document_type"],
+                    file=document["file"],
+                    user_id=user["_id"],
+                    created_at=document["file"].get("created_at")
+                )
+                manifest.append(new_document.insert())
+            migrated += Document.replace_manifest(user["_id"], manifest)
+        logger.info(f"Documentos migrados. {migrated}")
+        return migrated
+
+    @staticmethod
+    def migrate_base64_files():
+        migrated = Document.migrate_base64_files() + PartnerBiometrics.migrate_base64_files()
+        logger.info(f"Arquivos convertidos para binário. {migrated}")
+        return migrated
+
+    @staticmethod
+    def find_user_by_id(user_id, fields=None):
+        """Busca o usuário sem a senha. Com `fields`, só esses campos são
+        lidos do banco e só os criptografados entre eles são
+        descriptografados; `fields=["_id"]` apenas confirma que o usuário
+        existe."""
+        # Documentos voltam só como manifesto; arquivos ainda embutidos no
+        # usuário (antes de migrate-documents) nunca são lidos aqui. Os
+        # índices cegos são chaves internas de busca e não saem da API.
+        if fields is None:
+            projection = {"password": 0, "documents.file": 0, **{field: 0 for field in User.BLIND_INDEX_FIELDS}}
+        else:
+            projection = {field: 1 for field in fields if field not in ("password", "documents")}
+            if "documents" in fields:
+                projection.update({f"documents.{field}": 1 for field in Document.MANIFEST_FIELDS})
+        user = User.find_by_id(user_id, projection)
         if not user:
             logger.error("Usuário não encontrado")
             raise UserNotFound("Usuário não encontrado")
         user["_id"] = str(user["_id"])
-        if user["cpf"]:
-            user["cpf"] = CryptController.decrypt(user["cpf"])
-        if user["cnpj"]:
-            user["cnpj"] = CryptController.decrypt(user["cnpj"])
-        if user["email"]:
-            user["email"] = CryptController.decrypt(user["email"])
-        user.pop("password")
+        crypted_fields = [field for field in UserController.CRYPTED_FIELDS if user.get(field)]
+        decrypted_values = CryptController.decrypt_many([user[field] for field in crypted_fields])
+        for field, value in zip(crypted_fields, decrypted_values):
+            user[field] = value
+        for document in user.get("documents", []):
+            # Documentos ainda embutidos (antes de migrate-documents) não têm
+            # document_id e voltam com None até a migração.
+            document_id = document.get("document_id")
+            document["document_id"] = str(document_id) if document_id else None
         return user
         
     @staticmethod
     def create_document(document, user_id):
 
-        UserController.find_user_by_id(user_id)
+        UserController.find_user_by_id(user_id, fields=["_id"])
 
         new_document = Document(
             document_type=document["document_type"],
@@ -145,18 +202,34 @@ class UserController:
         logger.info(f"Documento salvo. {document_id}")
         return document_id
     
+    @staticmethod
+    def get_document(user_id, document_id):
+        document = None
+        if ObjectId.is_valid(user_id) and ObjectId.is_valid(document_id):
+            document = Document.find_by_id(document_id, user_id)
+        if not document:
+            raise DocumentNotFound("Documento não encontrado.")
+
+        return {
+            "document_id": str(document["_id"]),
+            "data": file_bytes(document["file"]),
+            "content_type": document["file"]["content_type"],
+        }
+
     @staticmethod
     def save_biometric(biometric, user_id):
 
-        UserController.find_user_by_id(user_id)
+        UserController.find_user_by_id(user_id, fields=["_id"])
 
         new_biometric = Document(
             document_type="biometrics",
             file=biometric["file"],
-            user_id=user_id
+            user_id=user_id,
+            face_encoding=UserController.encode_biometric(biometric["file"]["data"])
         )
 
         biometric_id = new_biometric.save()
+        UserController.REFERENCE_CACHE.delete((user_id, False))
 
         logger.info(f"Biometria salvo. {biometric_id}")
         return biometric_id
@@ -164,40 +237,288 @@ class UserController:
     @staticmethod
     def save_biometric_for_partner(biometric):
 
+        face_encoding = UserController.encode_biometric(biometric["file"]["data"])
         new_biometric = PartnerBiometrics(
-            file=biometric["file"]
+            file=biometric["file"],
+            face_encoding=face_encoding
         )
 
         user_id = new_biometric.save()
+        UserController.REFERENCE_CACHE.delete((str(user_id), True))
+        if face_encoding:
+            FaceIndexController.add(user_id, face_encoding)
 
         return user_id
+
+    @staticmethod
+    def save_biometrics_for_partner_bulk(images):
+        """Cadastra biometrias de parceiro em lote.
+
+        `images` é um iterável de `(nome, content_type, bytes)`, consumido
+        em blocos de BIOMETRIC_BULK_BATCH_SIZE: cada bloco é codificado em
+        paralelo no pool biométrico e gravado com um insert_many ordenado.
+        No lugar dos bytes pode vir a exceção que recusou o arquivo antes da
+        leitura. Imagens recusadas, sem rosto ou que não puderam ser
+        processadas não são cadastradas e voltam em `failures`.
+        """
+        created = []
+        failures = []
+        images = iter(images)
+        position = 0
+        while True:
+            batch = list(islice(images, settings.BIOMETRIC_BULK_BATCH_SIZE))
+            if not batch:
+                break
+
+            rejected = {offset: data for offset, (_, _, data) in enumerate(batch) if isinstance(data, Exception)}
+            encodings = iter(BiometricEngine.run_many(
+                encode_face,
+                [(data,) for offset, (_, _, data) in enumerate(batch) if offset not in rejected],
+                blocking=True
+            ))
+
+            accepted = []
+            for offset, (name, content_type, data) in enumerate(batch):
+                encoding = rejected[offset] if offset in rejected else next(encodings)
+                if isinstance(encoding, Exception):
+                    failures.append({"index": position + offset, "filename": name, "error": encoding})
+                    continue
+                biometric = PartnerBiometrics(
+                    file={"data": data, "content_type": content_type},
+                    face_encoding=serialize_encoding(encoding)
+                )
+                accepted.append((position + offset, name, biometric))
+
+            try:
+                user_ids = PartnerBiometrics.save_many([biometric for _, _, biometric in accepted])
+            except BulkWriteError as e:
+                inserted = e.details.get("nInserted", 0)
+                user_ids = [biometric.user_id for _, _, biometric in accepted[:inserted]]
+                for index, name, _ in accepted[inserted:]:
+                    failures.append({"index": index, "filename": name, "error": e})
+
+            for (index, name, biometric), user_id in zip(accepted, user_ids):
+                FaceIndexController.add(user_id, biometric.face_encoding)
+                created.append({"index": index, "filename": name, "user_id": str(user_id)})
+
+            position += len(batch)
+
+        logger.info(f"Biometrias de parceiro cadastradas em lote. {len(created)} criadas, {len(failures)} com falha")
+        return created, failures
+
+    @staticmethod
+    def encode_biometric(image_bytes):
+        try:
+            encoding = BiometricEngine.run(encode_face, image_bytes)
+        except FaceNotDetected:
+            logger.info("Nenhum rosto encontrado na biometria.")
+            return None
+        except Exception as e:
+            logger.error(f"Não foi possível calcular a codificação facial: {e}")
+            return None
+        return serialize_encoding(encoding)
+
+    @staticmethod
+    def backfill_face_encodings():
+        """Calcula a codificação das biometrias que não a possuem: cadastros
+        antigos e os que falharam ao codificar no cadastro (por exemplo com o
+        pool ocupado). As de parceiros também entram no índice facial."""
+        updated = 0
+        for document in Document.find_biometrics_without_face_encoding():
+            face_encoding = UserController.encode_biometric(file_bytes(document["file"]))
+            if face_encoding:
+                updated += Document.update_face_encoding(document["_id"], face_encoding)
+        for biometric in PartnerBiometrics.find_without_face_encoding():
+            face_encoding = UserController.encode_biometric(file_bytes(biometric["file"]))
+            if face_encoding and PartnerBiometrics.update_face_encoding(biometric["_id"], face_encoding):
+                updated += 1
+                UserController.REFERENCE_CACHE.delete((str(biometric["user_id"]), True))
+                # A carga do índice só busca no Mongo as biometrias criadas
+                # depois do snapshot; as antigas entram pelo log de deltas.
+                FaceIndexController.add(biometric["user_id"], face_encoding)
+        logger.info(f"Codificações faciais atualizadas. {updated}")
+        return updated
     
     @staticmethod
-    def validate_biometrics(image, user_id, is_from_partner):
+    def validate_biometrics(image, user_id, is_from_partner, blocking=False):
 
-        biometric = UserController.get_biometric(user_id, is_from_partner)
-        is_valid = ValidateBiometric().validate_faces(image, biometric)
+        usr_img, usr_encoding = UserController.get_biometric_reference(user_id, is_from_partner)
+
+        # Reenvios da mesma imagem reaproveitam a codificação do probe. O
+        # hash é lido do stream, que segue para o decoder sem cópia.
+        probe_key = probe_cache_key(image)
+        inp_encoding = UserController.PROBE_CACHE.get(probe_key)
+        if inp_encoding is not None and usr_encoding is not None:
+            is_valid = np.linalg.norm(usr_encoding - inp_encoding) <= settings.FACE_MATCH_TOLERANCE
+        else:
+            is_valid, inp_encoding = BiometricEngine.run(
+                validate_faces, image, usr_img, usr_encoding, inp_encoding, blocking=blocking
+            )
+            if inp_encoding is not None:
+                UserController.PROBE_CACHE.set(probe_key, inp_encoding)
 
         if is_valid:
             return True
         else:
             raise BiometricsNotValid("Biometria inválida.")
+
+    @staticmethod
+    def get_biometric_reference(user_id, is_from_partner):
+        cache_key = (user_id, is_from_partner == "true")
+        usr_encoding = UserController.REFERENCE_CACHE.get(cache_key)
+        if usr_encoding is not None:
+            return None, usr_encoding
+
+        biometric = UserController.find_biometric(user_id, is_from_partner)
+        usr_encoding = deserialize_encoding(biometric.get("face_encoding"))
+        UserController.REFERENCE_CACHE.set(cache_key, usr_encoding)
+        return file_bytes(biometric["file"]), usr_encoding
+
+    @staticmethod
+    def validate_biometrics_batch(items, is_from_partner):
+        """Valida vários pares (user_id, imagem) de uma vez.
+
+        Os probes são codificados em paralelo no pool biométrico, as
+        referências vêm de uma única consulta e as distâncias são calculadas
+        numa só operação. Cada item retorna `{"valid", "distance"}` ou a
+        exceção que o impediu de ser validado.
+        """
+        probes = UserController.encode_probes([image.read() for _, image in items])
+        references = UserController.get_biometric_references([user_id for user_id, _ in items], is_from_partner)
+
+        results = []
+        comparable = []
+        for position, ((user_id, _), probe) in enumerate(zip(items, probes)):
+            reference = references[user_id]
+            if isinstance(reference, Exception):
+                results.append(reference)
+            elif isinstance(probe, Exception):
+                results.append(probe)
+            else:
+                results.append(None)
+                comparable.append(position)
+
+        if comparable:
+            probe_matrix = np.array([probes[position] for position in comparable])
+            reference_matrix = np.array([references[items[position][0]] for position in comparable])
+            distances = np.linalg.norm(probe_matrix - reference_matrix, axis=1)
+            for position, distance in zip(comparable, distances):
+                results[position] = {
+                    "valid": bool(distance <= settings.FACE_MATCH_TOLERANCE),
+                    "distance": float(distance)
+                }
+        return results
+
+    @staticmethod
+    def get_biometric_references(user_ids, is_from_partner):
+        """Retorna, para cada user_id, a codificação de referência ou a
+        exceção de não encontrado, consultando o banco uma única vez para
+        os ids fora do cache."""
+        from_partner = is_from_partner == "true"
+        references = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            usr_encoding = UserController.REFERENCE_CACHE.get((user_id, from_partner))
+            if usr_encoding is not None:
+                references[user_id] = usr_encoding
+            elif not ObjectId.is_valid(user_id):
+                references[user_id] = BiometricsNotFound("Biometria não encontrada.")
+            else:
+                missing.append(user_id)
+
+        if not missing:
+            return references
+
+        object_ids = [ObjectId(user_id) for user_id in missing]
+        if from_partner:
+            existing = set(object_ids)
+            biometrics = PartnerBiometrics.find_by_user_ids(object_ids)
+        else:
+            existing = User.find_existing_ids(object_ids)
+            biometrics = Document.find_latest_by_user_ids(existing, "biometrics")
+
+        # Biometrias antigas sem codificação salva são codificadas a partir
+        # da imagem, também em paralelo.
+        legacy = []
+        for user_id, object_id in zip(missing, object_ids):
+            biometric = biometrics.get(object_id)
+            if object_id not in existing:
+                references[user_id] = UserNotFound("Usuário não encontrado")
+            elif biometric is None:
+                references[user_id] = BiometricsNotFound("Biometria não encontrada.")
+            else:
+                usr_encoding = deserialize_encoding(biometric.get("face_encoding"))
+                if usr_encoding is None:
+                    legacy.append(user_id)
+                else:
+                    references[user_id] = usr_encoding
+                    UserController.REFERENCE_CACHE.set((user_id, from_partner), usr_encoding)
+
+        if legacy:
+            images = [(UserController.get_biometric(user_id, is_from_partner),) for user_id in legacy]
+            for user_id, usr_encoding in zip(legacy, BiometricEngine.run_many(encode_face, images)):
+                references[user_id] = usr_encoding
+                if not isinstance(usr_encoding, Exception):
+                    UserController.REFERENCE_CACHE.set((user_id, from_partner), usr_encoding)
+        return references
+
+    @staticmethod
+    def encode_probes(images):
+        """Codifica imagens de probe, consultando antes o cache pelo hash do
+        conteúdo. Só as imagens fora do cache vão para o pool biométrico."""
+        keys = [probe_cache_key(image_bytes) for image_bytes in images]
+        encodings = [UserController.PROBE_CACHE.get(key) for key in keys]
+
+        missing = [position for position, encoding in enumerate(encodings) if encoding is None]
+        if missing:
+            computed = BiometricEngine.run_many(encode_face, [(images[position],) for position in missing])
+            for position, encoding in zip(missing, computed):
+                encodings[position] = encoding
+                if not isinstance(encoding, Exception):
+                    UserController.PROBE_CACHE.set(keys[position], encoding)
+        return encodings
+
+    @staticmethod
+    def identify_biometric(image, top_k):
+        probe_encoding = UserController.encode_probes([image.read()])[0]
+        if isinstance(probe_encoding, Exception):
+            raise probe_encoding
+
+        user_ids, distances = FaceIndexController.search(probe_encoding, top_k)
+
+        matches = []
+        for user_id, distance in zip(user_ids, distances):
+            matches.append({
+                "user_id": user_id,
+                "distance": float(distance),
+                "match": bool(distance <= settings.FACE_MATCH_TOLERANCE)
+            })
+        return matches
+
+    @staticmethod
+    def reference_cache_stats():
+        return UserController.REFERENCE_CACHE.stats()
+
+    @staticmethod
+    def probe_cache_stats():
+        return UserController.PROBE_CACHE.stats()
         
     @staticmethod
     def get_biometric(user_id, is_from_partner):
-        biometric = []
+        biometric = UserController.find_biometric(user_id, is_from_partner)
+        return file_bytes(biometric["file"])
+
+    @staticmethod
+    def find_biometric(user_id, is_from_partner):
+        biometric = None
         if is_from_partner == "true":
             user = PartnerBiometrics.find_by_user_id(user_id)
             user = list(user)
             for item in user:
-                biometric = item["file"]["file_b64"]
+                biometric = item
         else:
-            user = UserController.find_user_by_id(user_id)
-            if not user.get("documents"):
-                raise BiometricsNotFound("Biometria não encontrada.")
-            for document in user["documents"]:
-                if document["document_type"] == "biometrics":
-                    biometric = document["file"]["file_b64"]
+            UserController.find_user_by_id(user_id, fields=["_id"])
+            biometric = Document.find_latest_by_user_id(user_id, "biometrics")
         if not biometric:
             raise BiometricsNotFound("Biometria não encontrada.")
 
@@ -205,7 +526,7 @@ class UserController:
 
     @staticmethod
     def get_balance(user_id):
-            user = UserController.find_user_by_id(user_id)
+            user = UserController.find_user_by_id(user_id, fields=["balance", "currency"])
             
             result = {
                 "balance": user.get("balance"),
@@ -215,7 +536,7 @@ class UserController:
         
     @staticmethod
     def update_balance(balance, user_id): 
-            UserController.find_user_by_id(user_id)
+            UserController.find_user_by_id(user_id, fields=["_id"])
 
             updated_user = User.update(balance, user_id)
 
@@ -223,12 +544,12 @@ class UserController:
         
     @staticmethod
     def create_expense(user_id, expense):
-            user = UserController.find_user_by_id(user_id)
+            user = UserController.find_user_by_id(user_id, fields=["external_id"])
             external_id = user["external_id"]
             return ExpensesController.create_expense(external_id, expense["reason"], expense["value"], expense["category"])
 
     @staticmethod
     def get_expenses(user_id):
-            user = UserController.find_user_by_id(user_id)
+            user = UserController.find_user_by_id(user_id, fields=["external_id"])
             external_id = user["external_id"]
             return ExpensesController.list_expenses(external_id)
\ No newline at end of file
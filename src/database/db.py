@@ -1,10 +1,61 @@
+import threading
 from pymongo import MongoClient
 from pymongo.collection import Collection
+from settings import settings
+
+
+def client_options():
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
+    }
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return options
+
+
+def get_client(mongodb_uri=None, **kwargs):
+    """Retorna o MongoClient compartilhado para a URI, criando-o na primeira
+    chamada. Com connect=False nenhuma conexão é aberta até a primeira
+    operação, então importar a aplicação não depende do Mongo."""
+    mongodb_uri = mongodb_uri or settings.MONGO_DATABASE_URI
+    with MongoDBManager.LOCK:
+        if mongodb_uri not in MongoDBManager.CONNECTIONS:
+            options = {**client_options(), **kwargs}
+            MongoDBManager.CONNECTIONS[mongodb_uri] = MongoClient(mongodb_uri, connect=False, **options)
+            MongoDBManager.CONNECTION_COUNT += 1
+        return MongoDBManager.CONNECTIONS[mongodb_uri]
+
+
+class LazyDatabase:
+    """Referência a um banco que só resolve o client no primeiro acesso."""
+
+    def __init__(self, db_name, mongodb_uri=None):
+        self._db_name = db_name
+        self._mongodb_uri = mongodb_uri
+        self._database = None
+
+    def _get(self):
+        if self._database is None:
+            self._database = get_client(self._mongodb_uri).get_database(self._db_name)
+        return self._database
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __getitem__(self, name):
+        return self._get()[name]
 
 
 class MongoDBManager:
     CONNECTIONS = {}
     CONNECTION_COUNT = 0
+    CHECKED_DB_NAMES = set()
+    LOCK = threading.RLock()
 
     def __init__(
         self,
@@ -14,18 +65,21 @@ class MongoDBManager:
         soft_delete: bool = True,
         **kwargs,
     ):
-        if mongodb_uri not in MongoDBManager.CONNECTIONS:
-            MongoDBManager.CONNECTIONS[mongodb_uri] = MongoClient(mongodb_uri, **kwargs)
-            MongoDBManager.CONNECTION_COUNT += 1
-        self.client = MongoDBManager.CONNECTIONS[mongodb_uri]
+        self.client = get_client(mongodb_uri, **kwargs)
         self._check_duplicated_db_name(db_name)
         self.db = self.client.get_database(db_name)
         self.collection: Collection = self.db.get_collection(collection_name)
         self.soft_delete = soft_delete
 
     def _check_duplicated_db_name(self, db_name):
+        # list_database_names é uma ida ao servidor; cada nome é verificado
+        # uma vez por client.
+        key = (id(self.client), db_name)
+        if key in MongoDBManager.CHECKED_DB_NAMES:
+            return
         dbs = {o.lower(): o for o in self.client.list_database_names()}
         if db_name.lower() in dbs and dbs[db_name.lower()] != db_name:
             raise Exception(
                 f"""Current DB_NAME <{db_name}> duplicated with already existed DB_NAME: <{dbs[db_name.lower()]}>"""
-            )
\ No newline at end of file
+            )
+        MongoDBManager.CHECKED_DB_NAMES.add(key)
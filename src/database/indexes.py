@@ -0,0 +1,117 @@
+import logging
+import pymongo
+from pymongo.errors import OperationFailure
+from database.models import db, db_for_partner, User
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Consultas que varrem a coleção de propósito, por serem usadas só em
+# migrações/backfills: User.find_without_blind_index,
+# Document.find_users_with_embedded_files,
+# Document.find_biometrics_without_face_encoding,
+# PartnerBiometrics.find_without_face_encoding e migrate_base64_files.
+INDEXES = [
+    *[
+        {
+            "database": db,
+            "collection": "users",
+            "keys": [(field, pymongo.ASCENDING)],
+            "options": {"unique": True, "partialFilterExpression": {field: {"$type": "string"}}},
+        }
+        for field in User.BLIND_INDEX_FIELDS
+    ],
+    {
+        "database": db,
+        "collection": "documents",
+        "keys": [("user_id", pymongo.ASCENDING), ("document_type", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)],
+        "options": {},
+    },
+    {
+        "database": db_for_partner,
+        "collection": "biometrics",
+        "keys": [("user_id", pymongo.ASCENDING)],
+        "options": {},
+    },
+    {
+        "database": db_for_partner,
+        "collection": "biometrics",
+        "keys": [("face_encoding.model", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)],
+        "options": {},
+    },
+    {
+        "database": db,
+        "collection": "biometric_jobs",
+        "keys": [("expires_at", pymongo.ASCENDING)],
+        "options": {"expireAfterSeconds": 0},
+    },
+]
+
+COMPARED_OPTIONS = ("unique", "partialFilterExpression", "expireAfterSeconds", "sparse")
+
+
+def index_name(keys):
+    """Mesmo nome que o MongoDB gera por padrão, para reconhecer índices já
+    criados antes do registro."""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _collections():
+    collections = {}
+    for index in INDEXES:
+        key = (index["database"].name, index["collection"])
+        collections.setdefault(key, (index["database"][index["collection"]], []))[1].append(index)
+    return collections.values()
+
+
+def index_drift():
+    """Compara os índices declarados com os existentes e retorna as
+    diferenças como `{collection, name, problem}`: `missing`, `changed`
+    (chaves ou opções diferentes) ou `extra` (não declarado)."""
+    drift = []
+    for collection, declared in _collections():
+        existing = collection.index_information()
+        declared_names = set()
+        for index in declared:
+            name = index_name(index["keys"])
+            declared_names.add(name)
+            actual = existing.get(name)
+            if actual is None:
+                drift.append({"collection": collection.full_name, "name": name, "problem": "missing"})
+                continue
+            expected_options = {option: index["options"].get(option) for option in COMPARED_OPTIONS}
+            actual_options = {option: actual.get(option) for option in COMPARED_OPTIONS}
+            if [tuple(key) for key in actual["key"]] != index["keys"] or expected_options != actual_options:
+                drift.append({"collection": collection.full_name, "name": name, "problem": "changed"})
+        for name in existing:
+            if name != "_id_" and name not in declared_names:
+                drift.append({"collection": collection.full_name, "name": name, "problem": "extra"})
+    return drift
+
+
+def apply_indexes(prune=False):
+    """Cria os índices declarados que faltam e registra o drift restante.
+
+    É idempotente: índices iguais já existentes não são alterados. Com
+    `prune=True`, índices alterados são recriados e os não declarados são
+    removidos.
+    """
+    if prune:
+        for problem in index_drift():
+            if problem["problem"] in ("changed", "extra"):
+                database_name, collection_name = problem["collection"].split(".", 1)
+                db.client[database_name][collection_name].drop_index(problem["name"])
+                logger.info(f"Índice removido: {problem['collection']}.{problem['name']}")
+
+    for collection, declared in _collections():
+        for index in declared:
+            name = index_name(index["keys"])
+            try:
+                collection.create_index(index["keys"], name=name, **index["options"])
+            except OperationFailure as e:
+                logger.error(f"Não foi possível criar o índice {collection.full_name}.{name}: {e}")
+
+    drift = index_drift()
+    for problem in drift:
+        logger.warning(f"Drift de índice em {problem['collection']}: {problem['name']} ({problem['problem']})")
+    return drift
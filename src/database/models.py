@@ -1,16 +1,20 @@
-import bcrypt
 import pymongo
 
+from bson.binary import Binary
 from bson.objectid import ObjectId
+from database.db import LazyDatabase
+from datetime import timedelta
 from settings import settings
-from utils.index import default_datetime
+from utils.index import default_datetime, file_bytes
 
-db_client = pymongo.MongoClient(settings.MONGO_DATABASE_URI)
-db = db_client.get_database(settings.MONGO_DATABASE_NAME)
-db_for_partner = db_client.get_database(settings.MONGO_BIOMETRICS_DATABASE_NAME)
+db = LazyDatabase(settings.MONGO_DATABASE_NAME)
+db_for_partner = LazyDatabase(settings.MONGO_BIOMETRICS_DATABASE_NAME)
 
 class User:
-    def __init__(self, name, email, cpf, cnpj, cellphone, currency, balance, agency, institution, account, password, external_id):
+    BLIND_INDEX_FIELDS = ["email_index", "cpf_index", "cnpj_index"]
+
+    def __init__(self, name, email, cpf, cnpj, cellphone, currency, balance, agency, institution, account, password, external_id,
+                 email_index=None, cpf_index=None, cnpj_index=None):
         self.name = name
         self.email = email
         self.cpf = cpf
@@ -23,6 +27,9 @@ class User:
         self.account = account
         self.password = password
         self.external_id = external_id
+        self.email_index = email_index
+        self.cpf_index = cpf_index
+        self.cnpj_index = cnpj_index
 
     def save(self):
         user = {
@@ -38,6 +45,9 @@ class User:
             "account": self.account,
             "password": self.password,
             "external_id": self.external_id,
+            "email_index": self.email_index,
+            "cpf_index": self.cpf_index,
+            "cnpj_index": self.cnpj_index,
             "created_at": default_datetime(),
             "updated_at": default_datetime(),
         }
@@ -48,22 +58,32 @@ class User:
         result = db.users.find({})
         return result
     
-    def find_by_id(user_id):
-        result = db.users.find({"_id": ObjectId(user_id)})
+    def find_by_id(user_id, projection=None):
+        result = db.users.find({"_id": ObjectId(user_id)}, projection)
         user = next(result, None)
         return user
     
-    def find_by_email(email):
-        result = db.users.find_one({"email": email})
-        return result
+    def find_existing_ids(user_ids):
+        result = db.users.find({"_id": {"$in": list(user_ids)}}, {"_id": 1})
+        return {user["_id"] for user in result}
 
-    def find_by_cpf(cpf):
-        result = db.users.find_one({"cpf": cpf})
+    def find_by_blind_index(field, value_index):
+        result = db.users.find_one({f"{field}_index": value_index})
         return result
-    
-    def find_by_cnpj(cnpj):
-        result = db.users.find_one({"cnpj": cnpj})
+
+    def find_without_blind_index():
+        result = db.users.find({"email_index": {"$exists": False}})
         return result
+
+    def update_password(user_id, password):
+        filter = {"_id": ObjectId(user_id)}
+        result = db.users.update_one(filter, {"$set": {"password": password, "updated_at": default_datetime()}})
+        return result.modified_count
+
+    def update_blind_index(user_id, indexes):
+        filter = {"_id": ObjectId(user_id)}
+        result = db.users.update_one(filter, {"$set": indexes})
+        return result.modified_count
     
     def update(balance, user_id):
         update_value = {
@@ -83,24 +103,47 @@ class User:
 
     
 class Document:
-    def __init__(self, document_type, file, user_id):
+    MANIFEST_FIELDS = ("document_id", "document_type", "content_type", "size", "created_at")
+
+    def __init__(self, document_type, file, user_id, created_at=None, face_encoding=None):
         self.document_type = document_type
         self.file = file
         self.user_id = user_id
+        self.created_at = created_at
+        self.face_encoding = face_encoding
+
+    def insert(self):
+        created_at = self.created_at or default_datetime()
+        data = file_bytes(self.file)
+        document = {
+            "user_id": ObjectId(self.user_id),
+            "document_type": self.document_type,
+            "file": {
+                "data": Binary(data),
+                "content_type": self.file["content_type"],
+                "sha256": self.file.get("sha256"),
+                "created_at": created_at,
+                "updated_at": default_datetime(),
+            },
+            "face_encoding": self.face_encoding,
+            "created_at": created_at,
+            "updated_at": default_datetime(),
+        }
+        result = db.documents.insert_one(document)
+        manifest = {
+            "document_id": result.inserted_id,
+            "document_type": self.document_type,
+            "content_type": self.file["content_type"],
+            "size": len(data),
+            "created_at": created_at,
+        }
+        return manifest
 
     def save(self):
+        manifest = self.insert()
         add_value = {
-            "$addToSet": {
-                "documents":
-                {
-                    "document_type": self.document_type,
-                    "file": {
-                        "file_b64": self.file["file_b64"],
-                        "content_type": self.file["content_type"],
-                        "created_at": default_datetime(),
-                        "updated_at": default_datetime(),
-                    }
-                }
+            "$push": {
+                "documents": manifest
             }
         }
 
@@ -111,30 +154,164 @@ class Document:
         if result.modified_count > 0:
             return self.user_id
         else:
+            db.documents.delete_one({"_id": manifest["document_id"]})
             return None
+
+    def find_by_id(document_id, user_id):
+        result = db.documents.find_one({"_id": ObjectId(document_id), "user_id": ObjectId(user_id)})
+        return result
+
+    def find_latest_by_user_id(user_id, document_type):
+        result = db.documents.find_one(
+            {"user_id": ObjectId(user_id), "document_type": document_type},
+            sort=[("created_at", pymongo.DESCENDING)]
+        )
+        return result
+
+    def find_latest_by_user_ids(user_ids, document_type):
+        result = db.documents.find(
+            {"user_id": {"$in": list(user_ids)}, "document_type": document_type},
+            {"user_id": 1, "face_encoding": 1, "created_at": 1},
+            sort=[("created_at", pymongo.ASCENDING)]
+        )
+        return {document["user_id"]: document for document in result}
+
+    def find_users_with_embedded_files():
+        result = db.users.find({"documents.file": {"$exists": True}})
+        return result
+
+    def replace_manifest(user_id, manifest):
+        filter = {"_id": ObjectId(user_id)}
+        result = db.users.update_one(filter, {"$set": {"documents": manifest}})
+        return result.modified_count
+
+    def find_biometrics_without_face_encoding():
+        result = db.documents.find({
+            "document_type": "biometrics",
+            "face_encoding.model": {"$ne": settings.FACE_ENCODING_MODEL}
+        })
+        return result
+
+    def update_face_encoding(document_id, face_encoding):
+        return update_face_encoding(db.documents, document_id, face_encoding)
+
+    def migrate_base64_files():
+        return migrate_base64_files(db.documents)
         
 
 class PartnerBiometrics:
-    def __init__(self, file):
+    def __init__(self, file, face_encoding=None):
         self.file = file
+        self.face_encoding = face_encoding
+        self.user_id = None
         
-    def save(self):
-        user_id = ObjectId()
+    def to_document(self):
+        user_id = self.user_id = ObjectId()
         partner_biometrics = {
             "file": {
-                "file_b64": self.file["file_b64"],
+                "data": Binary(self.file["data"]),
                 "content_type": self.file["content_type"],
+                "sha256": self.file.get("sha256"),
                 "created_at": default_datetime(),
                 "updated_at": default_datetime(),
             },
             "user_id": user_id,
+            "face_encoding": self.face_encoding,
             "created_at": default_datetime(),
             "updated_at": default_datetime(),
         }
 
+        return user_id, partner_biometrics
+
+    def save(self):
+        user_id, partner_biometrics = self.to_document()
         db_for_partner.biometrics.insert_one(partner_biometrics)
         return user_id
+
+    def save_many(biometrics):
+        """Insere as biometrias em ordem com um único insert_many e retorna
+        os user_ids gerados."""
+        documents = [biometric.to_document() for biometric in biometrics]
+        if documents:
+            db_for_partner.biometrics.insert_many([document for _, document in documents], ordered=True)
+        return [user_id for user_id, _ in documents]
     
     def find_by_user_id(user_id):
         result = db_for_partner.biometrics.find({"user_id": ObjectId(user_id)})
-        return result
\ No newline at end of file
+        return result
+
+    def find_by_user_ids(user_ids):
+        result = db_for_partner.biometrics.find(
+            {"user_id": {"$in": list(user_ids)}},
+            {"user_id": 1, "face_encoding": 1, "created_at": 1}
+        )
+        return {biometric["user_id"]: biometric for biometric in result}
+
+    def find_face_encodings(since=None, limit=None):
+        filter = {"face_encoding.model": settings.FACE_ENCODING_MODEL}
+        if since is not None:
+            filter["created_at"] = {"$gte": since}
+        result = db_for_partner.biometrics.find(filter, {"user_id": 1, "face_encoding": 1, "created_at": 1})
+        if limit:
+            result = result.sort("created_at", pymongo.ASCENDING).limit(limit)
+        return result
+
+    def find_without_face_encoding():
+        result = db_for_partner.biometrics.find({"face_encoding.model": {"$ne": settings.FACE_ENCODING_MODEL}})
+        return result
+
+    def update_face_encoding(biometric_id, face_encoding):
+        return update_face_encoding(db_for_partner.biometrics, biometric_id, face_encoding)
+
+    def migrate_base64_files():
+        return migrate_base64_files(db_for_partner.biometrics)
+
+
+def update_face_encoding(collection, row_id, face_encoding):
+    update_value = {"$set": {"face_encoding": face_encoding, "updated_at": default_datetime()}}
+    result = collection.update_one({"_id": row_id}, update_value)
+    return result.modified_count
+
+
+def migrate_base64_files(collection):
+    migrated = 0
+    rows = collection.find({"file.file_b64": {"$exists": True}}, {"file.file_b64": 1})
+    for row in rows:
+        update_value = {
+            "$set": {"file.data": Binary(file_bytes(row["file"]))},
+            "$unset": {"file.file_b64": ""}
+        }
+        result = collection.update_one({"_id": row["_id"]}, update_value)
+        migrated += result.modified_count
+    return migrated
+
+
+class BiometricJob:
+    def __init__(self, user_id, is_from_partner, callback_url=None):
+        self.user_id = user_id
+        self.is_from_partner = is_from_partner
+        self.callback_url = callback_url
+
+    def save(self):
+        job = {
+            "user_id": self.user_id,
+            "is_from_partner": self.is_from_partner,
+            "callback_url": self.callback_url,
+            "state": "pending",
+            "result": None,
+            "error": None,
+            "created_at": default_datetime(),
+            "updated_at": default_datetime(),
+            "expires_at": default_datetime() + timedelta(seconds=settings.BIOMETRIC_ASYNC_JOB_TTL),
+        }
+        result = db.biometric_jobs.insert_one(job)
+        return result.inserted_id
+
+    def find_by_id(job_id):
+        result = db.biometric_jobs.find_one({"_id": ObjectId(job_id)})
+        return result
+
+    def update(job_id, values):
+        values["updated_at"] = default_datetime()
+        result = db.biometric_jobs.update_one({"_id": ObjectId(job_id)}, {"$set": values})
+        return result.modified_count
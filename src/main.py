@@ -1,14 +1,85 @@
+import click
 from flask import Flask
 from flask_cors import CORS
 from views.api import bp as views_bp
 from settings import settings
+from database.indexes import apply_indexes
+from controllers.user_controller import UserController
+from controllers.face_index_controller import FaceIndexController
+from utils.biometric_engine import BiometricEngine
+from utils.face_index import benchmark
+from utils.http_client import HttpClient
+from utils.uploads import UploadRequest
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = UploadRequest
     CORS(app, resources={r"/*": {"origins": "*"}})
 
     app.config.from_object(settings)
+    app.config["MAX_CONTENT_LENGTH"] = settings.UPLOAD_MAX_REQUEST_SIZE
     app.register_blueprint(views_bp)
+
+    if settings.MONGO_APPLY_INDEXES:
+        apply_indexes()
+
+    if settings.BIOMETRIC_WORKERS > 0:
+        BiometricEngine.start()
+
+    if settings.HTTP_PRECONNECT:
+        HttpClient.preconnect([settings.CRYPTO_URL, settings.EXPENSES_API])
+
+    @app.cli.command("sync-indexes")
+    @click.option("--prune", is_flag=True, help="Recria índices alterados e remove os não declarados.")
+    def sync_indexes(prune):
+        """Aplica os índices declarados em database/indexes.py e mostra o drift."""
+        drift = apply_indexes(prune=prune)
+        for problem in drift:
+            print(f"{problem['collection']}: {problem['name']} ({problem['problem']})")
+        print(f"Índices fora do declarado: {len(drift)}")
+
+    @app.cli.command("backfill-blind-indexes")
+    def backfill_blind_indexes():
+        """Gera os índices cegos de email/CPF/CNPJ para usuários antigos."""
+        updated = UserController.backfill_blind_indexes()
+        print(f"Usuários atualizados: {updated}")
+
+    @app.cli.command("migrate-documents")
+    def migrate_documents():
+        """Move os arquivos embutidos no usuário para a coleção de documentos."""
+        migrated = UserController.migrate_embedded_documents()
+        print(f"Usuários migrados: {migrated}")
+
+    @app.cli.command("migrate-file-binary")
+    def migrate_file_binary():
+        """Converte arquivos salvos em base64 para binário BSON."""
+        migrated = UserController.migrate_base64_files()
+        print(f"Arquivos convertidos: {migrated}")
+
+    @app.cli.command("backfill-face-encodings")
+    def backfill_face_encodings():
+        """Calcula a codificação facial das biometrias que ainda não a possuem."""
+        updated = UserController.backfill_face_encodings()
+        print(f"Biometrias atualizadas: {updated}")
+
+    @app.cli.command("rebuild-face-index")
+    def rebuild_face_index():
+        """Grava um novo snapshot do índice facial dos parceiros a partir do Mongo,
+        com um log de deltas novo."""
+        added = FaceIndexController.rebuild()
+        print(f"Codificações indexadas: {added}")
+
+    @app.cli.command("benchmark-face-index")
+    @click.option("--size", default=100000, help="Quantidade de codificações sintéticas.")
+    @click.option("--queries", default=100, help="Quantidade de consultas.")
+    @click.option("--top-k", default=5, help="Quantidade de vizinhos por consulta.")
+    def benchmark_face_index(size, queries, top_k):
+        """Compara recall e latência do índice facial com a busca exata."""
+        build_seconds, results = benchmark(size=size, queries=queries, top_k=top_k)
+        print(f"Construção do índice: {build_seconds:.2f}s")
+        for result in results:
+            print(f"n_probe={result['n_probe']}: recall={result['recall']:.3f} {result['ms_per_query']:.2f}ms/consulta")
+
     return app
 
 if __name__ == '__main__':
@@ -1,7 +1,7 @@
-import base64
 import re
 from marshmallow import Schema, fields, validate, ValidationError, pre_load
 from utils.index import validate_cpf, validate_cnpj
+from utils.uploads import read_upload
 
 def validate_password_complexity(password):
     if len(password) < 8:
@@ -74,8 +74,9 @@ class LoginSchema(Schema):
         return data
 
 class ImageSchema(Schema):
-    file_b64 = fields.Str(required=True, error_messages={"required": "O arquivo é obrigatório"})
+    data = fields.Raw(required=True, error_messages={"required": "O arquivo é obrigatório"})
     content_type = fields.Str(required=True, error_messages={"required": "O tipo do arquivo é obrigatório"})
+    sha256 = fields.Str()
 
 class DocumentSchema(Schema):
     document_type = fields.Str(required=True, validate=validate.OneOf(["cnh", "rne", "rg", "biometrics"]))
@@ -87,15 +88,7 @@ class DocumentSchema(Schema):
         if not file:
             raise ValidationError("É necessário fornecer um arquivo.")
         
-        file_binary = file.read()
-        file_b64 = base64.b64encode(file_binary).decode('utf-8')
-        content_type = file.content_type
-
-        file_data = {
-            "file_b64": file_b64,
-            "content_type": content_type
-        }
-        data.update({"file": file_data})
+        data.update({"file": read_upload(file)})
         return data
     
 class BiometricSchema(Schema):
@@ -107,13 +100,5 @@ class BiometricSchema(Schema):
         if not file:
             raise ValidationError("É necessário fornecer um arquivo.")
         
-        file_binary = file.read()
-        file_b64 = base64.b64encode(file_binary).decode('utf-8')
-        content_type = file.content_type
-
-        file_data = {
-            "file_b64": file_b64,
-            "content_type": content_type
-        }
-        data.update({"file": file_data})
+        data.update({"file": read_upload(file)})
         return data
\ No newline at end of file
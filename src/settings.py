@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Settings:
     def __init__(self):
@@ -6,13 +7,70 @@ class Settings:
         self.MONGO_DATABASE_URI = os.getenv("MONGO_DATABASE_URI", "mongodb://localhost:27017")
         self.MONGO_DATABASE_NAME = os.getenv("MONGO_DATABASE_NAME", "user-dev")
         self.USER_COLLECTION = "users"
+        self.MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+        self.MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+        self.MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+        self.MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+        self.MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+        self.MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+        self.MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+        self.MONGO_APPLY_INDEXES = os.getenv("MONGO_APPLY_INDEXES", "true").lower() == "true"
         self.MONGO_BIOMETRICS_DATABASE_NAME = os.getenv("MONGO_BIOMETRICS_DATABASE_NAME", "biometrics-dev")
         self.BIOMETRICS_COLLECTION = "biometrics"
         self.VALID_DOCUMENTS_EXTENSIONS = ["doc", "docx", "pdf", "jpg", "jpeg", "png", "xml"]
+        self.UPLOAD_MAX_FILE_SIZE = int(os.getenv("UPLOAD_MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+        self.UPLOAD_MAX_REQUEST_SIZE = int(os.getenv("UPLOAD_MAX_REQUEST_SIZE", str(32 * 1024 * 1024)))
+        self.UPLOAD_MAX_BULK_REQUEST_SIZE = int(os.getenv("UPLOAD_MAX_BULK_REQUEST_SIZE", str(1024 * 1024 * 1024)))
+        self.UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(512 * 1024)))
+        self.FACE_ENCODING_MODEL = os.getenv("FACE_ENCODING_MODEL", "dlib_face_recognition_resnet_model_v1")
+        self.FACE_MATCH_TOLERANCE = float(os.getenv("FACE_MATCH_TOLERANCE", "0.6"))
+        self.IDENTIFY_TOP_K = int(os.getenv("IDENTIFY_TOP_K", "5"))
+        self.IDENTIFY_MAX_TOP_K = int(os.getenv("IDENTIFY_MAX_TOP_K", "50"))
+        self.FACE_INDEX_PATH = os.getenv("FACE_INDEX_PATH", os.path.join(tempfile.gettempdir(), "face_index"))
+        self.FACE_INDEX_LISTS = int(os.getenv("FACE_INDEX_LISTS", "0"))
+        self.FACE_INDEX_PROBES = int(os.getenv("FACE_INDEX_PROBES", "8"))
+        self.FACE_INDEX_MIN_TRAIN = int(os.getenv("FACE_INDEX_MIN_TRAIN", "1000"))
+        self.FACE_INDEX_SYNC_OVERLAP = int(os.getenv("FACE_INDEX_SYNC_OVERLAP", "60"))
+        self.FACE_INDEX_REFRESH_SECONDS = int(os.getenv("FACE_INDEX_REFRESH_SECONDS", "30"))
+        self.FACE_INDEX_SYNC_BATCH = int(os.getenv("FACE_INDEX_SYNC_BATCH", "1000"))
+        self.FACE_INDEX_COMPACT_AFTER = int(os.getenv("FACE_INDEX_COMPACT_AFTER", "10000"))
+        self.FACE_MAX_DIMENSION = int(os.getenv("FACE_MAX_DIMENSION", "800"))
+        self.FACE_DETECTION_MODEL = os.getenv("FACE_DETECTION_MODEL", "hog")
+        self.FACE_UPSAMPLE = int(os.getenv("FACE_UPSAMPLE", "1"))
+        self.FACE_NUM_JITTERS = int(os.getenv("FACE_NUM_JITTERS", "1"))
+        self.REFERENCE_CACHE_MAX_SIZE = int(os.getenv("REFERENCE_CACHE_MAX_SIZE", "10000"))
+        self.REFERENCE_CACHE_TTL = int(os.getenv("REFERENCE_CACHE_TTL", "600"))
+        self.PROBE_CACHE_MAX_SIZE = int(os.getenv("PROBE_CACHE_MAX_SIZE", "1000"))
+        self.PROBE_CACHE_TTL = int(os.getenv("PROBE_CACHE_TTL", "120"))
+        self.BIOMETRIC_WORKERS = int(os.getenv("BIOMETRIC_WORKERS", str(os.cpu_count() or 1)))
+        self.BIOMETRIC_QUEUE_SIZE = int(os.getenv("BIOMETRIC_QUEUE_SIZE", "32"))
+        self.BIOMETRIC_BATCH_MAX_SIZE = int(os.getenv("BIOMETRIC_BATCH_MAX_SIZE", "16"))
+        self.BIOMETRIC_BULK_BATCH_SIZE = int(os.getenv("BIOMETRIC_BULK_BATCH_SIZE", "64"))
+        self.BIOMETRIC_JOB_TIMEOUT = float(os.getenv("BIOMETRIC_JOB_TIMEOUT", "10"))
+        self.BIOMETRIC_ASYNC_WORKERS = int(os.getenv("BIOMETRIC_ASYNC_WORKERS", "4"))
+        self.BIOMETRIC_ASYNC_MAX_PENDING = int(os.getenv("BIOMETRIC_ASYNC_MAX_PENDING", "256"))
+        self.BIOMETRIC_ASYNC_JOB_TTL = int(os.getenv("BIOMETRIC_ASYNC_JOB_TTL", "3600"))
+        self.BIOMETRIC_CALLBACK_ALLOWED_HOSTS = [
+            host.strip() for host in os.getenv("BIOMETRIC_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+        ]
+        self.BIOMETRIC_MEMORY_REPORT = os.getenv("BIOMETRIC_MEMORY_REPORT", "false").lower() == "true"
+        self.BIOMETRIC_START_METHOD = os.getenv("BIOMETRIC_START_METHOD", "spawn")
         self.CRYPTO_PUBLIC_KEY = os.getenv("CRYPTO_PUBLIC_KEY", "public-key")
         self.CRYPTO_PRIVATE_KEY = os.getenv("CRYPTO_PRIVATE_KEY", "private-key")
+        self.BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+        self.BLIND_INDEX_KEY = os.getenv("BLIND_INDEX_KEY", "blind-index-key")
+        self.CRYPTO_BACKEND = os.getenv("CRYPTO_BACKEND", "remote")
+        self.CRYPTO_OAEP_HASH = os.getenv("CRYPTO_OAEP_HASH", "sha256")
+        self.DECRYPT_CACHE_ENABLED = os.getenv("DECRYPT_CACHE_ENABLED", "true").lower() == "true"
+        self.DECRYPT_CACHE_MAX_SIZE = int(os.getenv("DECRYPT_CACHE_MAX_SIZE", "10000"))
+        self.DECRYPT_CACHE_TTL = int(os.getenv("DECRYPT_CACHE_TTL", "300"))
+        self.CRYPTO_MAX_CONCURRENCY = int(os.getenv("CRYPTO_MAX_CONCURRENCY", "4"))
         self.CRYPTO_URL = "https://5a7udyuiimjx3rngjs7lp4dxee0phmbl.lambda-url.us-east-1.on.aws"
         self.EXPENSES_API = "https://back-end-d5im.onrender.com"
+        self.HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+        self.HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+        self.HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+        self.HTTP_PRECONNECT = os.getenv("HTTP_PRECONNECT", "false").lower() == "true"
         self.USER_EXPENSES_API = os.getenv("USER_EXPENSES_API" ,"email-expanses")
         self.PASSWORD_EXPENSES_API = os.getenv("PASSWORD_EXPENSES_API" ,"123")
 
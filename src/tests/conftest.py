@@ -1,12 +1,21 @@
 import pytest
 from flask import Flask
 from pymongo import MongoClient
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 from main import create_app
+from controllers.face_index_controller import FaceIndexController
+from controllers.user_controller import UserController
 from settings import settings
 
 @pytest.fixture
-def app():
+def app(monkeypatch, tmp_path):
     """Fixture para criar uma instância do aplicativo Flask para os testes."""
+    monkeypatch.setattr(settings, "BIOMETRIC_WORKERS", 0)
+    monkeypatch.setattr(settings, "BIOMETRIC_ASYNC_WORKERS", 0)
+    monkeypatch.setattr(settings, "FACE_INDEX_PATH", str(tmp_path / "face_index"))
+    FaceIndexController.reset()
+    UserController.PROBE_CACHE.clear()
     app = create_app()
 
     app.config["TESTING"] = True
@@ -16,11 +25,18 @@ def app():
     with app.app_context():
         client = MongoClient(app.config["MONGO_DATABASE_URI"])
         db = client[app.config["MONGO_DATABASE_NAME"]]
+        db_for_partner = client[settings.MONGO_BIOMETRICS_DATABASE_NAME]
         db.users.delete_many({})
+        db.documents.delete_many({})
+        db.biometric_jobs.delete_many({})
+        db_for_partner.biometrics.delete_many({})
 
         yield app
 
         db.users.delete_many({})
+        db.documents.delete_many({})
+        db.biometric_jobs.delete_many({})
+        db_for_partner.biometrics.delete_many({})
         client.close()
 
 @pytest.fixture
@@ -31,40 +47,52 @@ def client(app):
 
 @pytest.fixture
 def mock_encrypt(mocker):
+    encrypted_values = {
+        "fulano@example.com": "email",
+        "912.815.100-33": "cpf",
+        "35.830.173/0001-11": "cnpj",
+        "Senha123!": "password"
+    }
     mock_encrypt = mocker.patch(
         "controllers.crypt_controller.CryptController.encrypt", 
-        side_effect=[
-            "email",
-            "cpf",
-            "cnpj",
-            "password",
-            "email",
-            "cpf",
-            "cnpj",
-            "password"
-        ]
+        side_effect=encrypted_values.get
     )
     return mock_encrypt
 
 
 @pytest.fixture
 def mock_decrypt(mocker):
+    decrypted_values = {
+        "email": "fulano@example.com",
+        "cpf": "912.815.100-33",
+        "cnpj": "35.830.173/0001-11",
+        "password": "Senha123!"
+    }
     mock_decrypt = mocker.patch(
         "controllers.crypt_controller.CryptController.decrypt", 
-        side_effect=[
-            "fulano@example.com",
-            "912.815.100-33",
-            "35.830.173/0001-11",
-            "Senha123!",
-            "fulano@example.com",
-            "912.815.100-33",
-            "35.830.173/0001-11",
-            "Senha123!"
-        ]
+        side_effect=lambda message, use_cache=True: decrypted_values.get(message)
     )
     return mock_decrypt
 
 
+@pytest.fixture
+def local_crypto(mocker):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode("utf-8")
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode("utf-8")
+    mocker.patch.object(settings, "CRYPTO_BACKEND", "local")
+    mocker.patch.object(settings, "CRYPTO_PUBLIC_KEY", public_pem)
+    mocker.patch.object(settings, "CRYPTO_PRIVATE_KEY", private_pem)
+    return settings
+
+
 @pytest.fixture
 def mock_expenses_auth(mocker):
     mock_expenses_auth = mocker.patch(
@@ -144,7 +172,7 @@ def mock_expenses_list_categories(mocker):
 def mock_validate_biometrics_true(mocker):
     mock_validate_biometrics_true = mocker.patch(
         "utils.face_recog.ValidateBiometric.validate_faces", 
-        return_value=True
+        return_value=(True, None)
     )
     return mock_validate_biometrics_true
 
@@ -153,6 +181,6 @@ def mock_validate_biometrics_true(mocker):
 def mock_validate_biometrics_false(mocker):
     mock_validate_biometrics_false = mocker.patch(
         "utils.face_recog.ValidateBiometric.validate_faces", 
-        return_value=False
+        return_value=(False, None)
     )
     return mock_validate_biometrics_false
\ No newline at end of file
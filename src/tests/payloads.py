@@ -26,6 +26,8 @@ payload_biometrics = {
 
 payload_biometric_from_partner = {"integration": True}
 
+png_file_content = b"\x89PNG\r\n\x1a\nThis is a test file"
+
 payload_update_balance = {
     "balance": 300.0
 }
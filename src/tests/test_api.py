@@ -1,9 +1,30 @@
 from copy import deepcopy
+from datetime import datetime
 from io import BytesIO
+import hashlib
 import json
+import numpy as np
 import os
+import pytest
 import re
-from utils.exceptions import ExpensesException
+import requests
+import threading
+import zipfile
+from concurrent.futures import Future
+from bson.objectid import ObjectId
+from controllers.biometric_job_controller import BiometricJobController
+from controllers.crypt_controller import CryptController
+from controllers.face_index_controller import FaceIndexController
+from controllers.user_controller import UserController
+from database.db import MongoDBManager, get_client
+from database.indexes import apply_indexes, index_drift
+from database.models import BiometricJob, PartnerBiometrics, User, db, db_for_partner
+from settings import settings
+from utils.biometric_engine import BiometricEngine
+from utils.face_index import IVFFaceIndex
+from utils.face_recog import ValidateBiometric, probe_cache_key, serialize_encoding
+from utils.uploads import IMAGE_TYPES, UploadStream
+from utils.exceptions import BiometricsBusy, BiometricsTimeout, ExpensesException, FaceNotDetected
 from tests.payloads import (
     payload_create,
     payload_login,
@@ -11,7 +32,8 @@ from tests.payloads import (
     payload_update_balance,
     payload_expenses,
     payload_biometrics,
-    payload_biometric_from_partner
+    payload_biometric_from_partner,
+    png_file_content
 )
 
 
@@ -39,6 +61,24 @@ def test_create_user_error_user_exists(client, mock_encrypt, mock_decrypt, mock_
     assert data["message"] == "Email já está cadastrado"
 
 
+def test_create_user_error_cpf_exists(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa o endpoint de criação de usuário com CPF já cadastrado em outro e-mail."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+
+    payload_create_same_cpf = deepcopy(payload_create)
+    payload_create_same_cpf["email"] = "ciclano@example.com"
+    payload_create_same_cpf.pop("cnpj")
+
+    response = client.post("/create", json=payload_create_same_cpf)
+
+    data = json.loads(response.data)
+    assert response.status_code == 409
+    assert data["message"] == "CPF já está cadastrado"
+
+
 def test_create_user_error_invalid_payload(client):
     """Testa o endpoint de criação de usuário com payload inválido."""
     invalid_payload_create = deepcopy(payload_create)
@@ -65,6 +105,73 @@ def test_create_user_error_other_exeception(client, mocker):
     assert data["message"] == "Erro ao criar usuário"
 
 
+def test_get_user_skips_empty_crypted_fields(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa que campos vazios não são enviados ao serviço de criptografia."""
+
+    payload_create_without_cnpj = deepcopy(payload_create)
+    payload_create_without_cnpj.pop("cnpj")
+
+    response = client.post("/create", json=payload_create_without_cnpj)
+
+    assert response.status_code == 200
+    assert mock_encrypt.call_count == 2
+    user_id = response.json["user"]
+
+    response = client.get(f"/user/{user_id}")
+
+    assert response.status_code == 200
+    assert mock_decrypt.call_count == 2
+    assert response.json["cnpj"] is None
+    assert response.json["cpf"] == payload_create["cpf"]
+    assert not set(User.BLIND_INDEX_FIELDS) & set(response.json)
+
+    response = client.get(f"/user/{user_id}?fields=email_index")
+
+    assert response.status_code == 422
+
+
+def test_get_user_with_fields_decrypts_only_requested(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa a busca de usuário com fields= lendo e descriptografando só os campos pedidos."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    response = client.get(f"/user/{user_id}?fields=email,balance")
+
+    assert response.status_code == 200
+    assert response.json == {"_id": user_id, "email": payload_create["email"], "balance": 0.0}
+    assert mock_decrypt.call_count == 1
+
+    response = client.get(f"/user/{user_id}?fields=password")
+
+    assert response.status_code == 422
+
+
+def test_balance_and_expenses_skip_decryption(
+        client,
+        mock_encrypt,
+        mock_decrypt,
+        mock_expenses_auth,
+        mock_expenses_register,
+        mock_expenses_create,
+        mock_expenses_list
+    ):
+    """Testa que saldo e despesas não chamam o serviço de criptografia."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    assert client.get(f"/balance/{user_id}").status_code == 200
+    assert client.patch(f"/balance/{user_id}", json=payload_update_balance).status_code == 200
+    assert client.post(f"/expense/{user_id}", json=payload_expenses).status_code == 200
+    assert client.get(f"/expense/{user_id}").status_code == 200
+    assert mock_decrypt.call_count == 0
+
+
 def test_login_success_with_email(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de login de usuário com sucesso."""
 
@@ -117,6 +224,88 @@ def test_login_success_with_cnpj(client, mock_encrypt, mock_decrypt, mock_expens
     assert data["status"] == "success"
 
 
+def test_login_success_with_normalized_fields(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa o endpoint de login de usuário com e-mail em maiúsculas e CPF sem pontuação."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+
+    response = client.post("/login", json={"email": "Fulano@Example.com", "password": "Senha123!"})
+
+    assert response.status_code == 200
+
+    response = client.post("/login", json={"cpf": "91281510033", "password": "Senha123!"})
+
+    data = json.loads(response.data)
+    assert response.status_code == 200
+    assert data["status"] == "success"
+
+
+def test_login_success_with_local_crypto(client, local_crypto, mock_expenses_auth, mock_expenses_register):
+    """Testa cadastro e login usando a criptografia local em vez do serviço remoto."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    response = client.post("/login", json=payload_login)
+
+    assert response.status_code == 200
+    assert response.json["user"] == user_id
+
+    response = client.get(f"/user/{user_id}")
+
+    assert response.status_code == 200
+    assert response.json["email"] == payload_create["email"]
+    assert response.json["cpf"] == payload_create["cpf"]
+
+
+def test_get_user_uses_decrypt_cache(client, local_crypto, mock_expenses_auth, mock_expenses_register):
+    """Testa que leituras repetidas do usuário reaproveitam o cache de descriptografia."""
+
+    CryptController.clear_decrypt_cache()
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    response = client.get(f"/user/{user_id}")
+
+    assert response.status_code == 200
+    assert CryptController.decrypt_cache_stats()["hits"] == 0
+
+    response = client.get(f"/user/{user_id}")
+
+    assert response.status_code == 200
+    assert response.json["email"] == payload_create["email"]
+    assert CryptController.decrypt_cache_stats()["hits"] == 3
+
+
+def test_login_migrates_legacy_encrypted_password(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa o login de usuário com senha antiga criptografada, que deve ser migrada para bcrypt."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+    db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"password": "password"}})
+
+    response = client.post("/login", json=payload_login)
+
+    assert response.status_code == 200
+    assert mock_decrypt.call_count == 1
+    stored_password = db.users.find_one({"_id": ObjectId(user_id)})["password"]
+    assert stored_password.startswith("$2b$")
+
+    response = client.post("/login", json=payload_login)
+
+    assert response.status_code == 200
+    assert mock_decrypt.call_count == 1
+
+
 def test_login_invalid_password(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de login de usuário com senha inválida."""
 
@@ -186,7 +375,7 @@ def test_login_generic_error(client, mocker, mock_encrypt, mock_decrypt, mock_ex
 def test_documents_success(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de documento com sucesso."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -208,10 +397,225 @@ def test_documents_success(client, mock_encrypt, mock_decrypt, mock_expenses_aut
     assert data["status"] == "success"
 
 
+def test_documents_stored_outside_user(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa que o arquivo do documento fica na coleção de documentos e o usuário guarda apenas o manifesto."""
+
+    file_content = png_file_content
+    file = BytesIO(file_content)
+    file.name = "test_file.png"
+
+    payload_documents["file"] = (file, file.name)
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    response = client.put(
+        f'/documents/{user_id}',
+        data=payload_documents,
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+
+    response = client.get(f"/user/{user_id}")
+
+    assert response.status_code == 200
+    manifest = response.json["documents"]
+    assert len(manifest) == 1
+    assert manifest[0]["document_type"] == "cnh"
+    assert manifest[0]["size"] == len(file_content)
+    assert "file" not in manifest[0]
+    assert db.documents.count_documents({"user_id": ObjectId(user_id)}) == 1
+
+
+def test_download_document(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa o download do documento com Content-Length, ETag e Range."""
+
+    file_content = png_file_content
+    file = BytesIO(file_content)
+    file.name = "test_file.png"
+
+    payload_documents["file"] = (file, file.name)
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    response = client.put(
+        f'/documents/{user_id}',
+        data=payload_documents,
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+
+    response = client.get(f"/user/{user_id}?fields=documents")
+    document_id = response.json["documents"][0]["document_id"]
+    assert set(response.json["documents"][0]) == {"document_id", "document_type", "content_type", "size", "created_at"}
+
+    response = client.get(f"/documents/{user_id}/{document_id}")
+
+    assert response.status_code == 200
+    assert response.data == file_content
+    assert response.headers["Content-Length"] == str(len(file_content))
+    assert response.headers["ETag"] == f'"{document_id}"'
+
+    response = client.get(f"/documents/{user_id}/{document_id}", headers={"Range": "bytes=0-3"})
+
+    assert response.status_code == 206
+    assert response.data == file_content[:4]
+    assert response.headers["Content-Range"] == f"bytes 0-3/{len(file_content)}"
+
+    response = client.get(f"/documents/{user_id}/{document_id}", headers={"If-None-Match": f'"{document_id}"'})
+
+    assert response.status_code == 304
+
+    response = client.get(f"/documents/664e9b2da3835b65a119b35d/{document_id}")
+
+    assert response.status_code == 404
+    assert response.json == {"status": 404, "message": "Documento não encontrado."}
+
+
+def test_upload_stores_hash_and_detected_content_type(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa que o upload grava o sha256 calculado na leitura e o content type detectado pelos magic bytes."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    response = client.put(
+        f'/documents/{user_id}',
+        data={"document_type": "cnh", "file": (BytesIO(b"%PDF-1.4 documento"), "test_file.png", "text/html")},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    document = db.documents.find_one({"user_id": ObjectId(user_id)})
+    assert document["file"]["content_type"] == "application/pdf"
+    assert document["file"]["sha256"] == hashlib.sha256(b"%PDF-1.4 documento").hexdigest()
+
+
+def test_upload_rejects_unsupported_type(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa que arquivos com magic bytes de tipo não aceito são recusados com 415."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+
+    response = client.put(
+        f'/send_biometry/{user_id}',
+        data={"file": (BytesIO(b"%PDF-1.4 documento"), "test_file.png")},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 415
+    assert response.json["status"] == 415
+    assert db.documents.count_documents({"user_id": ObjectId(user_id)}) == 0
+
+
+def test_upload_rejects_oversized_file(client, monkeypatch):
+    """Testa que arquivos acima de UPLOAD_MAX_FILE_SIZE são recusados com 413 durante a leitura."""
+    monkeypatch.setattr(settings, "UPLOAD_MAX_FILE_SIZE", 1024)
+
+    response = client.post(
+        '/send_biometry',
+        data={"file": (BytesIO(png_file_content + b"x" * 2048), "test_file.png")},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 413
+    assert response.json["status"] == 413
+    assert db_for_partner.biometrics.count_documents({}) == 0
+
+
+def test_migrate_embedded_documents(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa a migração de documentos antigos embutidos no usuário."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+    embedded_document = {
+        "document_type": "biometrics",
+        "file": {"file_b64": "VGhpcyBpcyBhIHRlc3QgZmlsZQ==", "content_type": "image/png"}
+    }
+    db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"documents": [embedded_document]}})
+
+    assert UserController.migrate_embedded_documents() == 1
+
+    user = db.users.find_one({"_id": ObjectId(user_id)})
+    assert "file" not in user["documents"][0]
+    assert user["documents"][0]["size"] == len(b"This is a test file")
+
+    response = client.get(f"/get_biometry_status/{user_id}")
+
+    assert response.status_code == 200
+
+
+def test_get_user_with_legacy_embedded_document(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa a busca de usuário com documento embutido ainda não migrado."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+    embedded_document = {
+        "document_type": "biometrics",
+        "file": {"file_b64": "VGhpcyBpcyBhIHRlc3QgZmlsZQ==", "content_type": "image/png"}
+    }
+    db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"documents": [embedded_document]}})
+
+    response = client.get(f"/user/{user_id}")
+
+    assert response.status_code == 200
+    assert response.json["documents"] == [{"document_id": None, "document_type": "biometrics"}]
+
+
+def test_get_user_documents_field_with_legacy_manifest(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
+    """Testa fields=documents com documentos embutidos ainda não migrados, sem devolver o arquivo."""
+
+    response = client.post("/create", json=payload_create)
+
+    assert response.status_code == 200
+    user_id = response.json["user"]
+    embedded_document = {
+        "document_type": "cnh",
+        "file": {"file_b64": "VGhpcyBpcyBhIHRlc3QgZmlsZQ==", "content_type": "image/png"}
+    }
+    db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"documents": [embedded_document]}})
+
+    response = client.get(f"/user/{user_id}?fields=documents")
+
+    assert response.status_code == 200
+    assert response.json == {"_id": user_id, "documents": [{"document_id": None, "document_type": "cnh"}]}
+
+
+def test_migrate_base64_files(client):
+    """Testa a conversão de biometrias antigas em base64 para binário."""
+
+    user_id = ObjectId()
+    db_for_partner.biometrics.insert_one({
+        "user_id": user_id,
+        "file": {"file_b64": "VGhpcyBpcyBhIHRlc3QgZmlsZQ==", "content_type": "image/png"}
+    })
+
+    assert UserController.migrate_base64_files() >= 1
+
+    biometric = db_for_partner.biometrics.find_one({"user_id": user_id})
+    assert "file_b64" not in biometric["file"]
+    assert biometric["file"]["data"] == b"This is a test file"
+    assert UserController.get_biometric(str(user_id), "true") == b"This is a test file"
+
+
 def test_documents_user_doesnt_exists_payload(client):
     """Testa o endpoint de documento de usuário com usuário inexistente."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -232,7 +636,7 @@ def test_documents_user_doesnt_exists_payload(client):
 def test_documents_invalid_payload(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de documento de usuário com payload inválido."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -265,7 +669,7 @@ def test_documents_invalid_payload(client, mock_encrypt, mock_decrypt, mock_expe
 def test_documents_generic_error(client, mocker, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de documento de usuário com erro generico."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -631,10 +1035,21 @@ def test_get_expenses_categories_generic_error(
     assert response.json == {"status": 400, "message": "Erro ao buscar categorias de despesas"}
 
 
+def test_get_expenses_categories_timeout(client, mocker):
+    """Testa o endpoint de buscar categorias de despesas com timeout no serviço de despesas."""
+
+    mocker.patch("utils.http_client.HttpClient.get", side_effect=requests.Timeout("timeout"))
+
+    response = client.get(f"/expenses")
+
+    assert response.status_code == 400
+    assert response.json == {"status": 400, "message": "Não foi possível comunicar com o servidor de despesas"}
+
+
 def test_biometrics_success(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de biometria com sucesso."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -659,7 +1074,7 @@ def test_biometrics_success(client, mock_encrypt, mock_decrypt, mock_expenses_au
 def test_biometrics_user_doesnt_exists_payload(client):
     """Testa o endpoint de biometria de usuário com usuário inexistente."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -680,7 +1095,7 @@ def test_biometrics_user_doesnt_exists_payload(client):
 def test_biometrics_invalid_payload(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de briometria de usuário com payload inválido."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -713,7 +1128,7 @@ def test_biometrics_invalid_payload(client, mock_encrypt, mock_decrypt, mock_exp
 def test_biometrics_generic_error(client, mocker, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de biometria de usuário com erro generico."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -744,7 +1159,7 @@ def test_biometrics_generic_error(client, mocker, mock_encrypt, mock_decrypt, mo
 def test_get_biometrics_success(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de buscar biometria com sucesso."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -782,7 +1197,7 @@ def test_get_biometrics_user_doesnt_exists(client):
 def test_get_biometrics_doesnt_exists(client, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de buscar briometria sem biometria cadastrada."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -804,7 +1219,7 @@ def test_get_biometrics_doesnt_exists(client, mock_encrypt, mock_decrypt, mock_e
 def test_get_biometrics_generic_error(client, mocker, mock_encrypt, mock_decrypt, mock_expenses_auth, mock_expenses_register):
     """Testa o endpoint de buscar biometria de usuário com erro generico."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -848,7 +1263,7 @@ def test_validate_biometrics_success(
     """Testa o endpoint de validar biometria com sucesso."""
     payload_biometric_to_validate = {}
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -891,7 +1306,7 @@ def test_validate_biometrics_doesnt_match(
 
     payload_biometric_to_validate = {}
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -930,7 +1345,7 @@ def test_validate_biometrics_user_doesnt_exists(client):
 
     payload_biometric_to_validate = {}
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -957,7 +1372,7 @@ def test_validate_biometrics_doesnt_exists(client, mock_encrypt, mock_decrypt, m
 
     payload_biometric_to_validate = {}
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -988,7 +1403,7 @@ def test_validate_biometrics_generic_error(client, mocker, mock_encrypt, mock_de
 
     payload_biometric_to_validate = {}
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -1028,11 +1443,104 @@ def test_validate_biometrics_generic_error(client, mocker, mock_encrypt, mock_de
     assert data["message"] == "Erro ao validar biometria"
 
 
+def test_validate_biometrics_face_not_detected(client, mocker):
+    """Testa o endpoint de validar biometria com imagem sem rosto detectado."""
+    mocker.patch("utils.face_recog.ValidateBiometric.load_image", return_value=np.zeros((10, 10, 3), dtype=np.uint8))
+    mocker.patch("utils.face_recog.face_recognition.face_locations", return_value=[])
+
+    partner_biometrics = {}
+    file = BytesIO(png_file_content)
+    file.name = "test_file.png"
+    file_validate = BytesIO(b"This is a validation of test file")
+    file_validate.name = "test_file.png"
+
+    partner_biometrics["file"] = (file, file.name)
+
+    response = client.post(
+        f'/send_biometry',
+        data=partner_biometrics,
+        content_type='multipart/form-data'
+    )
+    user_id = response.json["user"]
+
+    response = client.post(
+        f'/biometrics/{user_id}',
+        data={"integration": "true", "file": (file_validate, file_validate.name)},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 422
+    assert response.json == {"status": 422, "message": "Nenhum rosto encontrado na imagem."}
+
+
+def test_validate_biometrics_engine_busy(client, mocker):
+    """Testa o endpoint de validar biometria com a fila de processamento biométrico cheia."""
+
+    file_validate = BytesIO(b"This is a validation of test file")
+    file_validate.name = "test_file.png"
+
+    mocker.patch(
+        "controllers.user_controller.UserController.validate_biometrics",
+        side_effect=BiometricsBusy("Serviço de biometria ocupado, tente novamente.")
+    )
+
+    response = client.post(
+        '/biometrics/664e9b2da3835b65a119b35d',
+        data={"file": (file_validate, file_validate.name)},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 503
+    assert response.json == {"status": 503, "message": "Serviço de biometria ocupado, tente novamente."}
+
+
+def test_validate_biometrics_engine_timeout(client, mocker):
+    """Testa o endpoint de validar biometria com tempo esgotado no processamento."""
+
+    file_validate = BytesIO(b"This is a validation of test file")
+    file_validate.name = "test_file.png"
+
+    mocker.patch(
+        "controllers.user_controller.UserController.validate_biometrics",
+        side_effect=BiometricsTimeout("Tempo esgotado no processamento biométrico.")
+    )
+
+    response = client.post(
+        '/biometrics/664e9b2da3835b65a119b35d',
+        data={"file": (file_validate, file_validate.name)},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 504
+    assert response.json == {"status": 504, "message": "Tempo esgotado no processamento biométrico."}
+
+
+def test_engine_timeout_keeps_slot_until_job_finishes(mocker, monkeypatch):
+    """Testa que um trabalho com tempo esgotado mantém sua vaga na fila até terminar."""
+    monkeypatch.setattr(settings, "BIOMETRIC_WORKERS", 1)
+    monkeypatch.setattr(settings, "BIOMETRIC_JOB_TIMEOUT", 0.01)
+    running = Future()
+    running.set_running_or_notify_cancel()
+    executor = mocker.Mock()
+    executor.submit.return_value = running
+    mocker.patch.object(BiometricEngine, "start", return_value=executor)
+    monkeypatch.setattr(BiometricEngine, "SLOTS", threading.BoundedSemaphore(1))
+
+    with pytest.raises(BiometricsTimeout):
+        BiometricEngine.run(len, b"image")
+
+    assert not BiometricEngine.SLOTS.acquire(blocking=False)
+
+    running.set_result(5)
+
+    assert BiometricEngine.SLOTS.acquire(blocking=False)
+
+
 def test_biometrics_from_partner_success(client):
     """Testa o endpoint de biometria de parceiro com sucesso."""
 
     partner_biometrics = {}
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -1068,7 +1576,7 @@ def test_biometrics_from_partner_generic_error(client, mocker):
     """Testa o endpoint de biometria de usuário de parceiro com erro generico."""
 
     partner_biometrics = {}
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -1094,7 +1602,7 @@ def test_get_biometrics_from_partner_success(client):
     """Testa o endpoint de buscar biometria de parceiro com sucesso."""
 
     partner_biometrics = {}
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file = BytesIO(file_content)
     file.name = "test_file.png"
 
@@ -1136,7 +1644,7 @@ def test_validate_biometrics_from_partner_success(
     ):
     """Testa o endpoint de validar biometria de parceiro com sucesso."""
     partner_biometrics = {}
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -1161,6 +1669,624 @@ def test_validate_biometrics_from_partner_success(
     assert response.status_code == 200
 
 
+def test_validate_faces_returns_probe_encoding(mocker):
+    """Testa que a validação devolve a codificação do probe em vez de guardá-la na classe."""
+    mocker.patch.object(ValidateBiometric, "encode_face", side_effect=[np.zeros(128), np.full(128, 0.01)])
+
+    is_valid, probe_encoding = ValidateBiometric().validate_faces(b"probe", b"reference")
+
+    assert is_valid
+    assert np.allclose(probe_encoding, 0.01)
+    assert not hasattr(ValidateBiometric, "probe_encoding")
+
+
+def test_probe_cache_key_hashes_stream_without_consuming_it():
+    """Testa que a chave do cache de probes é calculada do stream, que volta ao início para o decoder."""
+    stream = BytesIO(png_file_content)
+
+    assert probe_cache_key(stream) == probe_cache_key(png_file_content)
+    assert stream.tell() == 0
+
+    upload = UploadStream(IMAGE_TYPES)
+    upload.write(png_file_content)
+    upload.seek(0)
+
+    assert probe_cache_key(upload) == probe_cache_key(png_file_content)
+
+
+def test_validate_biometrics_from_partner_uses_stored_encoding(client, mocker, mock_validate_biometrics_true):
+    """Testa que a codificação facial é calculada no cadastro e reaproveitada na validação."""
+    mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.ones(128))
+
+    partner_biometrics = {}
+    file = BytesIO(png_file_content)
+    file.name = "test_file.png"
+    file_validate = BytesIO(b"This is a validation of test file")
+    file_validate.name = "test_file.png"
+
+    partner_biometrics["file"] = (file, file.name)
+
+    response = client.post(
+        f'/send_biometry',
+        data=partner_biometrics,
+        content_type='multipart/form-data'
+    )
+    user_id = response.json["user"]
+
+    stored = db_for_partner.biometrics.find_one({"user_id": ObjectId(user_id)})
+    assert stored["face_encoding"]["model"] == "dlib_face_recognition_resnet_model_v1"
+    assert len(stored["face_encoding"]["vector"]) == 128 * 4
+
+    response = client.post(
+        f'/biometrics/{user_id}',
+        data={"integration": "true", "file": (file_validate, file_validate.name)},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    usr_encoding = mock_validate_biometrics_true.call_args[0][2]
+    assert np.array_equal(usr_encoding, np.ones(128))
+
+
+def test_validate_biometrics_from_partner_uses_reference_cache(client, mocker, mock_validate_biometrics_true):
+    """Testa que validações repetidas do mesmo usuário reaproveitam a codificação em cache."""
+    mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.ones(128))
+    find_biometric = mocker.spy(UserController, "find_biometric")
+
+    file = BytesIO(png_file_content)
+    file.name = "test_file.png"
+
+    response = client.post(
+        f'/send_biometry',
+        data={"file": (file, file.name)},
+        content_type='multipart/form-data'
+    )
+    user_id = response.json["user"]
+    hits = UserController.reference_cache_stats()["hits"]
+
+    for _ in range(2):
+        file_validate = BytesIO(b"This is a validation of test file")
+        file_validate.name = "test_file.png"
+        response = client.post(
+            f'/biometrics/{user_id}',
+            data={"integration": "true", "file": (file_validate, file_validate.name)},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200
+
+    assert find_biometric.call_count == 1
+    assert UserController.reference_cache_stats()["hits"] == hits + 1
+
+    response = client.get("/health")
+
+    assert response.json["caches"]["biometric_reference"]["hits"] == hits + 1
+
+
+def test_validate_biometrics_from_partner_uses_probe_cache(client, mocker):
+    """Testa que reenvios da mesma imagem de probe reaproveitam a codificação em cache."""
+    encode_face = mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.zeros(128))
+
+    file = BytesIO(png_file_content)
+    file.name = "test_file.png"
+
+    response = client.post(
+        f'/send_biometry',
+        data={"file": (file, file.name)},
+        content_type='multipart/form-data'
+    )
+    user_id = response.json["user"]
+
+    for content in [b"This is a validation of test file", b"This is a validation of test file", b"This is a retry with other bytes"]:
+        file_validate = BytesIO(content)
+        file_validate.name = "test_file.png"
+        response = client.post(
+            f'/biometrics/{user_id}',
+            data={"integration": "true", "file": (file_validate, file_validate.name)},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200
+        assert response.json["message"] == "Biometria validada com sucesso!"
+
+    assert encode_face.call_count == 3
+
+    response = client.get("/health")
+
+    assert response.json["caches"]["biometric_probe"]["hits"] == 1
+    assert response.json["caches"]["biometric_probe"]["size"] == 2
+
+
+def test_biometrics_job_with_polling_and_callback(client, mocker, monkeypatch, mock_validate_biometrics_false):
+    """Testa a validação biométrica assíncrona com consulta do job e envio ao callback."""
+    monkeypatch.setattr(settings, "BIOMETRIC_CALLBACK_ALLOWED_HOSTS", ["partner.example.com"])
+    callback = mocker.patch("controllers.biometric_job_controller.HttpClient.post")
+    callback.return_value.status_code = 200
+
+    file = BytesIO(png_file_content)
+    file.name = "test_file.png"
+    response = client.post(
+        f'/send_biometry',
+        data={"file": (file, file.name)},
+        content_type='multipart/form-data'
+    )
+    user_id = response.json["user"]
+
+    file_validate = BytesIO(b"This is a validation of test file")
+    file_validate.name = "test_file.png"
+    response = client.post(
+        f'/biometrics/{user_id}/jobs',
+        data={
+            "integration": "true",
+            "callback_url": "https://partner.example.com/hooks/biometrics",
+            "file": (file_validate, file_validate.name)
+        },
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 202
+    job_id = response.json["job_id"]
+
+    response = client.get(f'/biometrics/jobs/{job_id}')
+
+    assert response.status_code == 200
+    job = response.json["job"]
+    assert job["state"] == "done"
+    assert job["result"] == {"valid": False}
+    assert job["callback"] == "delivered"
+    assert callback.call_args[0][0] == "https://partner.example.com/hooks/biometrics"
+    assert callback.call_args[1]["json"]["job_id"] == job_id
+    assert callback.call_args[1]["allow_redirects"] is False
+    assert db.biometric_jobs.find_one({"_id": ObjectId(job_id)})["expires_at"]
+
+
+def test_biometrics_job_spools_image_and_waits_for_engine_slot(mocker, monkeypatch):
+    """Testa que o job pendente guarda a imagem em arquivo temporário e espera vaga no pool biométrico."""
+    monkeypatch.setattr(settings, "BIOMETRIC_ASYNC_WORKERS", 1)
+    monkeypatch.setattr(BiometricJobController, "EXECUTOR", None)
+    mocker.patch.object(BiometricJob, "save", return_value="job")
+    mocker.patch.object(BiometricJob, "update")
+    received = {}
+
+    def validate_biometrics(image, user_id, is_from_partner, blocking=False):
+        received.update(image=image, content=image.read(), blocking=blocking)
+        return True
+
+    mocker.patch.object(UserController, "validate_biometrics", side_effect=validate_biometrics)
+
+    assert BiometricJobController.submit(BytesIO(png_file_content), "user", "true") == "job"
+    BiometricJobController.EXECUTOR.shutdown(wait=True)
+
+    assert received["content"] == png_file_content
+    assert received["blocking"] is True
+    assert not isinstance(received["image"], BytesIO)
+    assert received["image"].closed
+
+
+def test_biometrics_job_callback_redirect_is_not_delivered(mocker):
+    """Testa que o callback não segue redirecionamentos e que um 3xx é registrado como falha na entrega."""
+    mocker.patch.object(BiometricJobController, "find_job", return_value={"job_id": "job"})
+    update = mocker.patch.object(BiometricJob, "update")
+    callback = mocker.patch("controllers.biometric_job_controller.HttpClient.post")
+    callback.return_value.status_code = 302
+
+    BiometricJobController.notify("job", "https://partner.example.com/hooks/biometrics")
+
+    assert callback.call_args[1]["allow_redirects"] is False
+    callback.return_value.raise_for_status.assert_not_called()
+    update.assert_called_once_with("job", {"callback": "failed"})
+
+
+def test_biometrics_job_rejects_callback_host(client):
+    """Testa que jobs assíncronos só aceitam callbacks de hosts configurados."""
+    file_validate = BytesIO(b"This is a validation of test file")
+    file_validate.name = "test_file.png"
+
+    response = client.post(
+        '/biometrics/664e9b2da3835b65a119b35d/jobs',
+        data={"callback_url": "http://169.254.169.254/latest", "file": (file_validate, file_validate.name)},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 422
+    assert response.json["status"] == 422
+
+
+def test_biometrics_job_not_found(client):
+    """Testa a consulta de um job assíncrono inexistente."""
+
+    response = client.get('/biometrics/jobs/664e9b2da3835b65a119b35d')
+
+    assert response.status_code == 404
+    assert response.json == {"status": 404, "message": "Job não encontrado."}
+
+
+def test_identify_biometrics_success(client, mocker):
+    """Testa o endpoint de identificação 1:N retornando as biometrias mais próximas."""
+    far_encoding = np.zeros(128)
+    near_encoding = np.full(128, 0.02)
+    mocker.patch(
+        "utils.face_recog.ValidateBiometric.encode_face",
+        side_effect=[far_encoding, near_encoding, np.full(128, 0.021)]
+    )
+
+    user_ids = []
+    for _ in range(2):
+        file = BytesIO(png_file_content)
+        file.name = "test_file.png"
+        response = client.post(
+            f'/send_biometry',
+            data={"file": (file, file.name)},
+            content_type='multipart/form-data'
+        )
+        user_ids.append(response.json["user"])
+
+    file_identify = BytesIO(b"This is a validation of test file")
+    file_identify.name = "test_file.png"
+
+    response = client.post(
+        '/biometrics/identify',
+        data={"file": (file_identify, file_identify.name), "top_k": "1"},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    matches = response.json["matches"]
+    assert len(matches) == 1
+    assert matches[0]["user_id"] == user_ids[1]
+    assert matches[0]["match"] is True
+
+
+def test_identify_biometrics_sees_new_enrollments(client, mocker):
+    """Testa que biometrias cadastradas depois do carregamento do índice facial são encontradas."""
+    encode_face = mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.zeros(128))
+
+    def send_biometry():
+        file = BytesIO(png_file_content)
+        file.name = "test_file.png"
+        response = client.post(
+            f'/send_biometry',
+            data={"file": (file, file.name)},
+            content_type='multipart/form-data'
+        )
+        return response.json["user"]
+
+    def identify(content):
+        file_identify = BytesIO(content)
+        file_identify.name = "test_file.png"
+        return client.post(
+            '/biometrics/identify',
+            data={"file": (file_identify, file_identify.name), "top_k": "1"},
+            content_type='multipart/form-data'
+        )
+
+    send_biometry()
+    assert identify(b"This is a validation of test file").status_code == 200
+
+    encode_face.return_value = np.full(128, 0.5)
+    user_id = send_biometry()
+    response = identify(b"This is another validation of test file")
+
+    assert response.status_code == 200
+    assert response.json["matches"][0]["user_id"] == user_id
+    assert response.json["matches"][0]["distance"] == 0.0
+
+
+def test_identify_biometrics_loads_snapshot_and_delta_log(client, mocker):
+    """Testa que um worker novo carrega o snapshot do índice facial e o log de deltas sem varrer o Mongo."""
+    encode_face = mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.zeros(128))
+
+    def send_biometry():
+        file = BytesIO(png_file_content)
+        file.name = "test_file.png"
+        response = client.post(
+            f'/send_biometry',
+            data={"file": (file, file.name)},
+            content_type='multipart/form-data'
+        )
+        return response.json["user"]
+
+    send_biometry()
+    FaceIndexController.rebuild()
+    encode_face.return_value = np.full(128, 0.5)
+    user_id = send_biometry()
+
+    FaceIndexController.reset()
+    find_face_encodings = mocker.spy(PartnerBiometrics, "find_face_encodings")
+    file_identify = BytesIO(b"This is a validation of test file")
+    file_identify.name = "test_file.png"
+    response = client.post(
+        '/biometrics/identify',
+        data={"file": (file_identify, file_identify.name), "top_k": "2"},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    assert response.json["matches"][0]["user_id"] == user_id
+    assert len(response.json["matches"]) == 2
+    assert all(call.kwargs.get("since") is not None for call in find_face_encodings.call_args_list)
+
+
+def test_face_index_snapshot_keeps_previous_and_loads_resolved_current(tmp_path):
+    """Testa que o snapshot anterior é mantido e que a carga lê todos os arquivos do snapshot resolvido."""
+    snapshots = []
+    for size in (1, 2, 3):
+        index = IVFFaceIndex(min_train=0)
+        index.add([str(ObjectId()) for _ in range(size)], np.zeros((size, 128), dtype=np.float32))
+        snapshots.append(index.save(str(tmp_path)))
+        os.utime(tmp_path / snapshots[-1], (size, size))
+
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("snapshot-")) == sorted(snapshots[1:])
+
+    loaded = IVFFaceIndex.load(str(tmp_path))
+
+    assert loaded.snapshot == snapshots[-1]
+    assert loaded.size == 3
+
+
+def test_face_index_rebuild_starts_new_delta_log_generation(mocker, monkeypatch, tmp_path):
+    """Testa que cada snapshot tem seu próprio log de deltas e que a primeira carga não reconstrói um snapshot existente."""
+    monkeypatch.setattr(settings, "FACE_INDEX_PATH", str(tmp_path))
+    FaceIndexController.reset()
+    find_face_encodings = mocker.patch.object(PartnerBiometrics, "find_face_encodings", return_value=[])
+    first_id, second_id = str(ObjectId()), str(ObjectId())
+
+    FaceIndexController.rebuild()
+    first_snapshot = IVFFaceIndex.current_snapshot(str(tmp_path))
+    FaceIndexController.add(first_id, serialize_encoding(np.zeros(128)))
+
+    assert FaceIndexController.search(np.zeros(128), 1)[0][0] == first_id
+
+    FaceIndexController.rebuild()
+    second_snapshot = IVFFaceIndex.current_snapshot(str(tmp_path))
+    FaceIndexController.add(second_id, serialize_encoding(np.ones(128)))
+
+    assert second_snapshot != first_snapshot
+    assert os.path.getsize(tmp_path / first_snapshot / "delta.log") == 24 + 128 * 4
+    assert os.path.getsize(tmp_path / second_snapshot / "delta.log") == 24 + 128 * 4
+    assert FaceIndexController.rebuild(if_missing=True) == 0
+    assert len([call for call in find_face_encodings.call_args_list if not call.kwargs.get("since")]) == 2
+    assert IVFFaceIndex.current_snapshot(str(tmp_path)) == second_snapshot
+    FaceIndexController.reset()
+
+
+def test_face_index_compacts_after_threshold(mocker, monkeypatch, tmp_path):
+    """Testa que, passado FACE_INDEX_COMPACT_AFTER, um snapshot novo é gravado e carregado na busca seguinte."""
+    monkeypatch.setattr(settings, "FACE_INDEX_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FACE_INDEX_COMPACT_AFTER", 2)
+    monkeypatch.setattr(settings, "FACE_INDEX_SYNC_OVERLAP", 0)
+    FaceIndexController.reset()
+    rows = []
+    mocker.patch.object(
+        PartnerBiometrics,
+        "find_face_encodings",
+        side_effect=lambda since=None, limit=None: [row for row in rows if since is None or row["created_at"] >= since]
+    )
+
+    FaceIndexController.rebuild()
+    first_snapshot = IVFFaceIndex.current_snapshot(str(tmp_path))
+    FaceIndexController.search(np.zeros(128), 1)
+    for value in (0.0, 1.0):
+        user_id = ObjectId()
+        rows.append({"user_id": user_id, "face_encoding": serialize_encoding(np.full(128, value)), "created_at": datetime.utcnow()})
+        FaceIndexController.add(str(user_id), rows[-1]["face_encoding"])
+    FaceIndexController.search(np.zeros(128), 1)
+    FaceIndexController.COMPACTION.join()
+
+    assert IVFFaceIndex.current_snapshot(str(tmp_path)) != first_snapshot
+    index = FaceIndexController.index()
+    assert index.snapshot == IVFFaceIndex.current_snapshot(str(tmp_path))
+    assert len(index.base) == 2
+    FaceIndexController.search(np.zeros(128), 1)
+    assert FaceIndexController.COMPACTION.is_alive() is False
+    assert IVFFaceIndex.current_snapshot(str(tmp_path)) == index.snapshot
+    FaceIndexController.reset()
+
+
+def test_face_index_refresh_reads_other_hosts_in_batches(mocker, monkeypatch, tmp_path):
+    """Testa que o índice busca no Mongo, em lotes limitados, cadastros que não passaram pelo log de deltas deste host."""
+    monkeypatch.setattr(settings, "FACE_INDEX_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "FACE_INDEX_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(settings, "FACE_INDEX_SYNC_BATCH", 1)
+    FaceIndexController.reset()
+    find_face_encodings = mocker.patch.object(PartnerBiometrics, "find_face_encodings", return_value=[])
+    FaceIndexController.rebuild()
+    FaceIndexController.index()
+
+    rows = [
+        {"user_id": ObjectId(), "face_encoding": serialize_encoding(np.full(128, value)), "created_at": datetime.utcnow()}
+        for value in (0.0, 1.0)
+    ]
+    find_face_encodings.side_effect = [rows[:1], rows[1:]]
+    FaceIndexController.index()
+    index = FaceIndexController.index()
+
+    assert index.tail_ids == [str(row["user_id"]) for row in rows]
+    assert [call.kwargs["limit"] for call in find_face_encodings.call_args_list[-2:]] == [1, 1]
+    assert find_face_encodings.call_args_list[-1].kwargs["since"] == rows[0]["created_at"]
+    FaceIndexController.reset()
+
+
+def test_backfill_face_encodings_adds_partners_to_face_index(client, mocker):
+    """Testa que biometrias de parceiro antigas, codificadas pelo backfill, passam a ser encontradas na identificação."""
+    mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.full(128, 0.5))
+    FaceIndexController.rebuild()
+    user_id = ObjectId()
+    db_for_partner.biometrics.insert_one({
+        "user_id": user_id,
+        "file": {"data": png_file_content, "content_type": "image/png"},
+        "created_at": datetime(2020, 1, 1),
+    })
+    FaceIndexController.search(np.zeros(128), 1)
+
+    assert UserController.backfill_face_encodings() == 1
+
+    user_ids, distances = FaceIndexController.search(np.full(128, 0.5), 1)
+    assert user_ids == [str(user_id)]
+    assert distances[0] == 0.0
+
+
+def test_face_index_catch_up_compares_mongo_created_at(client, mocker):
+    """Testa que a carga do snapshot compara synced_at com o created_at devolvido pelo Mongo."""
+    mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.full(128, 0.5))
+    FaceIndexController.rebuild()
+
+    file = BytesIO(png_file_content)
+    response = client.post('/send_biometry', data={"file": (file, "test_file.png")}, content_type='multipart/form-data')
+    user_id = response.json["user"]
+
+    FaceIndexController.reset()
+    index = FaceIndexController.index()
+
+    assert index.synced_at.tzinfo is None
+    assert index.synced_at >= db_for_partner.biometrics.find_one({"user_id": ObjectId(user_id)})["created_at"]
+    assert FaceIndexController.search(np.full(128, 0.5), 1)[0] == [user_id]
+
+
+def test_validate_biometrics_batch(client, mocker):
+    """Testa o endpoint de validação biométrica em lote com resultados por item."""
+    mocker.patch(
+        "utils.face_recog.ValidateBiometric.encode_face",
+        side_effect=[np.zeros(128), np.zeros(128), np.ones(128), np.zeros(128)]
+    )
+
+    file = BytesIO(png_file_content)
+    file.name = "test_file.png"
+    response = client.post(
+        f'/send_biometry',
+        data={"file": (file, file.name)},
+        content_type='multipart/form-data'
+    )
+    user_id = response.json["user"]
+
+    find_by_user_ids = mocker.spy(PartnerBiometrics, "find_by_user_ids")
+    user_ids = [user_id, user_id, "664e9b2da3835b65a119b35d"]
+    files = []
+    for _ in user_ids:
+        file_validate = BytesIO(b"This is a validation of test file")
+        files.append((file_validate, "test_file.png"))
+
+    response = client.post(
+        '/biometrics/batch',
+        data={"user_id": user_ids, "file": files, "integration": "True"},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert [result["user_id"] for result in results] == user_ids
+    assert results[0]["status"] == "success" and results[0]["valid"] is True
+    assert results[1]["status"] == "success" and results[1]["valid"] is False
+    assert results[2]["status"] == 404
+    assert find_by_user_ids.call_count == 1
+
+
+def test_validate_biometrics_batch_mismatched_items(client):
+    """Testa o endpoint de validação biométrica em lote com user_ids sem imagem."""
+    file_validate = BytesIO(b"This is a validation of test file")
+
+    response = client.post(
+        '/biometrics/batch',
+        data={"user_id": ["664e9b2da3835b65a119b35d", "664e9b2da3835b65a119b35e"], "file": (file_validate, "test_file.png")},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 422
+    assert response.json["status"] == 422
+
+
+def test_create_biometrics_for_partner_bulk(client, mocker):
+    """Testa o cadastro de biometrias de parceiro em lote com falhas por imagem."""
+    mocker.patch(
+        "utils.face_recog.ValidateBiometric.encode_face",
+        side_effect=[np.zeros(128), FaceNotDetected("Nenhum rosto encontrado na imagem."), np.ones(128)]
+    )
+
+    files = [(BytesIO(png_file_content), f"test_file_{i}.png") for i in range(3)]
+    response = client.post(
+        '/send_biometry/bulk',
+        data={"file": files},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    assert [item["index"] for item in response.json["created"]] == [0, 2]
+    assert response.json["failures"][0]["filename"] == "test_file_1.png"
+    assert response.json["failures"][0]["status"] == 422
+    assert db_for_partner.biometrics.count_documents({}) == 2
+    for item in response.json["created"]:
+        assert db_for_partner.biometrics.find_one({"user_id": ObjectId(item["user_id"])})["face_encoding"]
+
+
+def test_create_biometrics_for_partner_bulk_from_archive(client, mocker, monkeypatch):
+    """Testa o cadastro de biometrias de parceiro em lote a partir de um arquivo zip, recusando membros grandes ou de outro tipo."""
+    encode_face = mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.zeros(128))
+    monkeypatch.setattr(settings, "UPLOAD_MAX_FILE_SIZE", 4096)
+
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("faces/", "")
+        zip_file.writestr("faces/a.png", png_file_content)
+        zip_file.writestr("faces/b.jpg", b"\xff\xd8\xffThis is another test file")
+        zip_file.writestr("faces/c.png", b"This is not an image")
+        zip_file.writestr("faces/d.png", png_file_content + b"\0" * 8192)
+    archive.seek(0)
+
+    response = client.post(
+        '/send_biometry/bulk',
+        data={"archive": (archive, "faces.zip")},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    assert [item["filename"] for item in response.json["created"]] == ["faces/a.png", "faces/b.jpg"]
+    assert [(item["filename"], item["status"]) for item in response.json["failures"]] == [("faces/c.png", 415), ("faces/d.png", 413)]
+    assert encode_face.call_count == 2
+    biometric = db_for_partner.biometrics.find_one({"user_id": ObjectId(response.json["created"][1]["user_id"])})
+    assert biometric["file"]["content_type"] == "image/jpeg"
+
+
+def test_create_biometrics_for_partner_bulk_accepts_archive_over_file_limit(client, mocker, monkeypatch):
+    """Testa que o zip do cadastro em lote pode passar de UPLOAD_MAX_FILE_SIZE, limite que vale para cada imagem."""
+    mocker.patch("utils.face_recog.ValidateBiometric.encode_face", return_value=np.zeros(128))
+    monkeypatch.setattr(settings, "UPLOAD_MAX_FILE_SIZE", 4096)
+
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zip_file:
+        for i in range(3):
+            zip_file.writestr(f"faces/{i}.png", png_file_content + b"x" * 2048)
+    assert archive.tell() > settings.UPLOAD_MAX_FILE_SIZE
+    archive.seek(0)
+    nested = BytesIO()
+    with zipfile.ZipFile(nested, "w") as zip_file:
+        zip_file.writestr("faces/a.png", png_file_content)
+    nested.seek(0)
+
+    response = client.post(
+        '/send_biometry/bulk',
+        data={"archive": (archive, "faces.zip"), "file": (nested, "nested.zip")},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    assert [item["filename"] for item in response.json["created"]] == ["faces/0.png", "faces/1.png", "faces/2.png"]
+    assert [(item["filename"], item["status"]) for item in response.json["failures"]] == [("nested.zip", 415)]
+
+
+def test_identify_biometrics_invalid_top_k(client):
+    """Testa o endpoint de identificação 1:N com top_k inválido."""
+
+    file_identify = BytesIO(b"This is a validation of test file")
+    file_identify.name = "test_file.png"
+
+    response = client.post(
+        '/biometrics/identify',
+        data={"file": (file_identify, file_identify.name), "top_k": "0"},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 422
+    assert response.json["status"] == 422
+
+
 def test_validate_biometrics_from_partner_doesnt_match(
         client,
         mock_encrypt,
@@ -1171,7 +2297,7 @@ def test_validate_biometrics_from_partner_doesnt_match(
     ):
     """Testa o endpoint de validar biometria de parceiro com biometria não reconhecida."""
     partner_biometrics = {}
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -1204,7 +2330,7 @@ def test_validate_biometrics_from_partner_doesnt_match(
 def test_validate_biometrics_from_partner_doesnt_exists(client):
     """Testa o endpoint de validar biometria de parceiro sem biometria cadastrada."""
 
-    file_content = b"This is a test file"
+    file_content = png_file_content
     file_content_validate = b"This is a validation of test file"
     file = BytesIO(file_content)
     file.name = "test_file.png"
@@ -1223,4 +2349,33 @@ def test_validate_biometrics_from_partner_doesnt_exists(client):
     data = json.loads(response.data)
     assert response.status_code == 404
     assert data["status"] == 404
-    assert data["message"] == "Biometria não encontrada."
\ No newline at end of file
+    assert data["message"] == "Biometria não encontrada."
+
+def test_indexes_applied_without_drift(app):
+    """Testa que os índices declarados são aplicados de forma idempotente e sem drift."""
+
+    assert apply_indexes() == []
+    assert apply_indexes() == []
+    assert index_drift() == []
+
+    partner_indexes = db_for_partner.biometrics.index_information()
+    assert "user_id_1" in partner_indexes
+    assert db.biometric_jobs.index_information()["expires_at_1"]["expireAfterSeconds"] == 0
+
+    db.documents.create_index("document_type")
+    assert {"collection": db.documents.full_name, "name": "document_type_1", "problem": "extra"} in index_drift()
+
+    apply_indexes(prune=True)
+    assert index_drift() == []
+
+
+def test_mongo_manager_shares_client_and_caches_db_name_check(app, mocker):
+    """Testa que os gerenciadores reaproveitam o client compartilhado e verificam o nome do banco uma única vez."""
+    MongoDBManager.CHECKED_DB_NAMES.clear()
+    list_database_names = mocker.spy(get_client(), "list_database_names")
+
+    first = MongoDBManager(settings.MONGO_DATABASE_URI, settings.MONGO_DATABASE_NAME, "users")
+    second = MongoDBManager(settings.MONGO_DATABASE_URI, settings.MONGO_DATABASE_NAME, "documents")
+
+    assert first.client is second.client is db.client
+    assert list_database_names.call_count == 1
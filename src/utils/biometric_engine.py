@@ -0,0 +1,151 @@
+import logging
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, wait
+from settings import settings
+from utils.exceptions import BiometricsBusy, BiometricsTimeout
+from utils.face_recog import ValidateBiometric
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _init_worker():
+    # Importar face_recog carrega os modelos do dlib uma vez por processo.
+    import utils.face_recog  # noqa: F401
+
+
+def _ping():
+    return True
+
+
+def encode_face(image):
+    return ValidateBiometric().encode_face(image)
+
+
+def validate_faces(inp_img, usr_img, usr_encoding=None, inp_encoding=None):
+    return ValidateBiometric().validate_faces(inp_img, usr_img, usr_encoding, inp_encoding)
+
+
+class BiometricEngine:
+    """Executa o reconhecimento facial em um pool de processos, fora das
+    threads que atendem a API.
+
+    Com BIOMETRIC_WORKERS=0 os trabalhos rodam na própria thread da
+    requisição.
+    """
+    EXECUTOR = None
+    SLOTS = None
+    LOCK = threading.Lock()
+
+    @staticmethod
+    def start():
+        with BiometricEngine.LOCK:
+            if BiometricEngine.EXECUTOR is None:
+                context = multiprocessing.get_context(settings.BIOMETRIC_START_METHOD)
+                BiometricEngine.EXECUTOR = ProcessPoolExecutor(
+                    max_workers=settings.BIOMETRIC_WORKERS,
+                    mp_context=context,
+                    initializer=_init_worker
+                )
+                BiometricEngine.SLOTS = threading.BoundedSemaphore(settings.BIOMETRIC_QUEUE_SIZE)
+                # Sobe os processos já na inicialização, para que a primeira
+                # requisição não pague o carregamento dos modelos.
+                for _ in range(settings.BIOMETRIC_WORKERS):
+                    BiometricEngine.EXECUTOR.submit(_ping)
+                logger.info(f"Pool biométrico iniciado com {settings.BIOMETRIC_WORKERS} processos.")
+        return BiometricEngine.EXECUTOR
+
+    @staticmethod
+    def shutdown():
+        with BiometricEngine.LOCK:
+            if BiometricEngine.EXECUTOR is not None:
+                BiometricEngine.EXECUTOR.shutdown(wait=False, cancel_futures=True)
+                BiometricEngine.EXECUTOR = None
+                BiometricEngine.SLOTS = None
+
+    @staticmethod
+    def submit(function, *args, blocking=False):
+        # Streams não atravessam processos; só aqui o upload vira bytes.
+        args = [arg.read() if hasattr(arg, "read") else arg for arg in args]
+        executor = BiometricEngine.start()
+        slots = BiometricEngine.SLOTS
+        # Requisições interativas falham na hora com a fila cheia; cargas em
+        # lote podem esperar uma vaga até o timeout de um trabalho.
+        timeout = settings.BIOMETRIC_JOB_TIMEOUT if blocking else None
+        if not slots.acquire(blocking=blocking, timeout=timeout):
+            logger.error("Fila de processamento biométrico cheia")
+            raise BiometricsBusy("Serviço de biometria ocupado, tente novamente.")
+        try:
+            future = executor.submit(function, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    @staticmethod
+    def run(function, *args, blocking=False):
+        """Executa `function` no pool e espera até BIOMETRIC_JOB_TIMEOUT.
+        Com `blocking=True` espera uma vaga na fila, como em `submit`.
+
+        No timeout a requisição recebe BiometricsTimeout, mas um trabalho
+        que já começou não é interrompido: o processo continua ocupado e a
+        vaga na fila só é liberada quando ele termina (no done callback de
+        `submit`), então a fila reflete os processos realmente ocupados.
+        """
+        if settings.BIOMETRIC_WORKERS <= 0:
+            return function(*args)
+        future = BiometricEngine.submit(function, *args, blocking=blocking)
+        try:
+            return future.result(timeout=settings.BIOMETRIC_JOB_TIMEOUT)
+        except TimeoutError:
+            # Só tem efeito se o trabalho ainda não saiu da fila.
+            future.cancel()
+            logger.error("Tempo esgotado no processamento biométrico")
+            raise BiometricsTimeout("Tempo esgotado no processamento biométrico.")
+
+    @staticmethod
+    def run_many(function, args_list, blocking=False):
+        """Executa `function` para cada tupla de `args_list` em paralelo no
+        pool. Retorna os resultados na mesma ordem; a falha de um item é
+        devolvida como a exceção correspondente, sem interromper os demais.
+
+        Com `blocking=True` a submissão espera por vagas na fila em vez de
+        marcar os itens excedentes como BiometricsBusy.
+        """
+        if settings.BIOMETRIC_WORKERS <= 0:
+            results = []
+            for args in args_list:
+                try:
+                    results.append(function(*args))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        futures = []
+        for args in args_list:
+            try:
+                futures.append(BiometricEngine.submit(function, *args, blocking=blocking))
+            except BiometricsBusy as e:
+                futures.append(e)
+
+        pending = [future for future in futures if not isinstance(future, Exception)]
+        # Cada processo atende um item por vez; o prazo cresce com o número
+        # de rodadas necessárias para o lote.
+        rounds = math.ceil(len(pending) / settings.BIOMETRIC_WORKERS) if pending else 0
+        wait(pending, timeout=settings.BIOMETRIC_JOB_TIMEOUT * rounds)
+
+        results = []
+        for future in futures:
+            if isinstance(future, Exception):
+                results.append(future)
+            elif not future.done():
+                future.cancel()
+                results.append(BiometricsTimeout("Tempo esgotado no processamento biométrico."))
+            elif future.exception() is not None:
+                results.append(future.exception())
+            else:
+                results.append(future.result())
+        return results
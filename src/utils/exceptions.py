@@ -10,12 +10,38 @@ class UserNotFound(Exception):
 class BiometricsNotFound(Exception):
     pass
 
+class DocumentNotFound(Exception):
+    pass
+
 class BiometricsNotValid(Exception):
     pass
 
+class FaceNotDetected(Exception):
+    pass
+
+class BiometricsBusy(Exception):
+    pass
+
+class BiometricsTimeout(Exception):
+    pass
+
+class BiometricJobNotFound(Exception):
+    pass
+
+class FileTooLarge(Exception):
+    pass
+
+class UnsupportedFileType(Exception):
+    pass
+
 class CryptoException(Exception):
     pass
 
+class CryptoBatchException(CryptoException):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"Erro ao processar itens do lote de criptografia: {errors}")
+
 class ExpensesException(Exception):
     pass
 
@@ -29,3 +55,20 @@ class UserNotFoundException(Exception):
 
 class InvalidCredentialsException(Exception):
     pass
+
+def biometric_error_status(e):
+    """Status HTTP de uma falha de biometria reportada por item (lotes e
+    jobs assíncronos)."""
+    if isinstance(e, (BiometricsNotFound, UserNotFound)):
+        return 404
+    if isinstance(e, FaceNotDetected):
+        return 422
+    if isinstance(e, FileTooLarge):
+        return 413
+    if isinstance(e, UnsupportedFileType):
+        return 415
+    if isinstance(e, BiometricsBusy):
+        return 503
+    if isinstance(e, BiometricsTimeout):
+        return 504
+    return 400
@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+from datetime import datetime, timezone
+from utils.face_search import nearest_faces
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+ID_LENGTH = 24
+
+
+def _squared_distances(vectors, centroids):
+    return (
+        np.einsum("ij,ij->i", vectors, vectors)[:, None]
+        - 2 * vectors @ centroids.T
+        + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+    )
+
+
+def _assign(vectors, centroids, block_size=4096):
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        assignments[start:start + block_size] = np.argmin(_squared_distances(block, centroids), axis=1)
+    return assignments
+
+
+def train_centroids(vectors, n_lists, iterations=10, sample_size=50000, seed=0):
+    """K-means simples sobre uma amostra das codificações."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        for list_id in range(n_lists):
+            members = vectors[assignments == list_id]
+            if len(members):
+                centroids[list_id] = members.mean(axis=0)
+    return centroids
+
+
+class IVFFaceIndex:
+    """Índice IVF (inverted file) aproximado sobre codificações faciais.
+
+    As codificações são agrupadas em `n_lists` listas por k-means; a busca
+    compara o probe apenas com as `n_probe` listas de centróide mais
+    próximo. Aumentar `n_probe` melhora o recall e aumenta a latência. Com
+    menos de `min_train` codificações o índice não é treinado e a busca é
+    exata.
+
+    As linhas do snapshot (`base`) podem vir de arquivos mapeados em memória
+    e nunca são alteradas; inserções novas vão para `tail`.
+    """
+
+    def __init__(self, dim=128, n_lists=0, n_probe=8, min_train=1000):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train = min_train
+        self.base = np.empty((0, dim), dtype=np.float32)
+        self.base_ids = np.empty(0, dtype=f"<U{ID_LENGTH}")
+        self.tail = np.empty((0, dim), dtype=np.float32)
+        self.tail_ids = []
+        self.centroids = None
+        self.list_rows = np.empty(0, dtype=np.int64)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        self.tail_lists = {}
+        self.synced_at = None
+        self.delta_offset = 0
+        self.snapshot = None
+        self.lock = threading.RLock()
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def size(self):
+        return len(self.base) + len(self.tail_ids)
+
+    def _id(self, row):
+        if row < len(self.base):
+            return str(self.base_ids[row])
+        return self.tail_ids[row - len(self.base)]
+
+    def _gather(self, rows):
+        split = np.searchsorted(rows, len(self.base))
+        return np.concatenate([
+            np.asarray(self.base[rows[:split]], dtype=np.float32),
+            self.tail[rows[split:] - len(self.base)],
+        ])
+
+    def _all_vectors(self):
+        return np.concatenate([np.asarray(self.base, dtype=np.float32), self.tail[:len(self.tail_ids)]])
+
+    def _reserve(self, count):
+        size = len(self.tail_ids)
+        if size + count <= len(self.tail):
+            return
+        capacity = max(size + count, 2 * len(self.tail), 1024)
+        tail = np.empty((capacity, self.dim), dtype=np.float32)
+        tail[:size] = self.tail[:size]
+        self.tail = tail
+
+    def add(self, ids, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self.lock:
+            self._reserve(len(vectors))
+            start = len(self.tail_ids)
+            self.tail[start:start + len(vectors)] = vectors
+            self.tail_ids.extend(ids)
+            if self.trained:
+                first_row = len(self.base) + start
+                for offset, list_id in enumerate(_assign(vectors, self.centroids)):
+                    self.tail_lists.setdefault(int(list_id), []).append(first_row + offset)
+            elif self.size >= self.min_train:
+                self.train()
+
+    def train(self):
+        with self.lock:
+            vectors = self._all_vectors()
+            n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+            n_lists = min(n_lists, len(vectors))
+            self.centroids = train_centroids(vectors, n_lists)
+            self._set_lists(_assign(vectors, self.centroids), n_lists)
+            logger.info(f"Índice facial treinado com {n_lists} listas e {len(vectors)} codificações.")
+
+    def _set_lists(self, assignments, n_lists):
+        self.list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=self.list_offsets[1:])
+        self.tail_lists = {}
+
+    def _candidates(self, probe_lists):
+        parts = [self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]] for list_id in probe_lists]
+        parts += [np.array(self.tail_lists.get(int(list_id), []), dtype=np.int64) for list_id in probe_lists]
+        return np.sort(np.concatenate(parts))
+
+    def search(self, probe, top_k, n_probe=None):
+        probe = np.asarray(probe, dtype=np.float32)
+        with self.lock:
+            if not self.trained:
+                rows = np.arange(self.size, dtype=np.int64)
+            else:
+                n_probe = min(n_probe or self.n_probe, len(self.centroids))
+                centroid_distances = _squared_distances(probe[None, :], self.centroids)[0]
+                rows = self._candidates(np.argpartition(centroid_distances, n_probe - 1)[:n_probe])
+
+            # Um id pode aparecer duas vezes numa janela de ressincronização;
+            # busca uma margem extra e mantém só a ocorrência mais próxima.
+            indexes, distances = nearest_faces(probe, self._gather(rows), top_k * 2)
+            ids = []
+            result_distances = []
+            for index, distance in zip(rows[indexes], distances):
+                user_id = self._id(index)
+                if user_id not in ids:
+                    ids.append(user_id)
+                    result_distances.append(distance)
+            return ids[:top_k], np.array(result_distances[:top_k], dtype=np.float32)
+
+    def save(self, directory, keep=2):
+        """Grava um novo snapshot em `directory` e aponta `current` para ele.
+
+        Processos que já mapearam o snapshot anterior continuam lendo os
+        arquivos antigos até recarregarem; só os `keep` snapshots mais
+        recentes (o novo e o anterior, por padrão) são mantidos em disco.
+        """
+        with self.lock:
+            os.makedirs(directory, exist_ok=True)
+            snapshot = f"snapshot-{uuid.uuid4().hex}"
+            snapshot_path = os.path.join(directory, snapshot)
+            os.makedirs(snapshot_path)
+
+            vectors = np.lib.format.open_memmap(
+                os.path.join(snapshot_path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(self.size, self.dim)
+            )
+            vectors[:len(self.base)] = self.base
+            vectors[len(self.base):] = self.tail[:len(self.tail_ids)]
+            vectors.flush()
+            del vectors
+
+            ids = np.concatenate([self.base_ids, np.array(self.tail_ids, dtype=f"<U{ID_LENGTH}")])
+            np.save(os.path.join(snapshot_path, "ids.npy"), ids)
+
+            if self.trained:
+                assignments = np.empty(self.size, dtype=np.int32)
+                for list_id in range(len(self.centroids)):
+                    start, end = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+                    assignments[self.list_rows[start:end]] = list_id
+                for list_id, rows in self.tail_lists.items():
+                    assignments[rows] = list_id
+                list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+                list_offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+                np.cumsum(np.bincount(assignments, minlength=len(self.centroids)), out=list_offsets[1:])
+                np.save(os.path.join(snapshot_path, "centroids.npy"), self.centroids)
+                np.save(os.path.join(snapshot_path, "list_rows.npy"), list_rows)
+                np.save(os.path.join(snapshot_path, "list_offsets.npy"), list_offsets)
+
+            meta = {
+                "size": self.size,
+                "dim": self.dim,
+                "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+            }
+            with open(os.path.join(snapshot_path, "meta.json"), "w") as meta_file:
+                json.dump(meta, meta_file)
+
+            current = os.path.join(directory, "current")
+            temporary_link = os.path.join(directory, f"current-{uuid.uuid4().hex}")
+            os.symlink(snapshot, temporary_link)
+            os.replace(temporary_link, current)
+
+            snapshots = sorted(
+                (name for name in os.listdir(directory) if name.startswith("snapshot-") and name != snapshot),
+                key=lambda name: os.path.getmtime(os.path.join(directory, name)),
+                reverse=True
+            )
+            for name in snapshots[keep - 1:]:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+            return snapshot
+
+    @staticmethod
+    def current_snapshot(directory):
+        try:
+            return os.readlink(os.path.join(directory, "current"))
+        except OSError:
+            return None
+
+    @staticmethod
+    def load(directory, n_probe=8, min_train=1000):
+        """Carrega o snapshot atual com os arrays mapeados em memória só
+        para leitura, compartilhando as páginas entre os processos.
+
+        `current` é resolvido uma única vez, então todos os arquivos vêm do
+        mesmo snapshot mesmo que outro processo troque o link durante a
+        carga."""
+        snapshot_path = os.path.realpath(os.path.join(directory, "current"))
+        with open(os.path.join(snapshot_path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+
+        index = IVFFaceIndex(dim=meta["dim"], n_probe=n_probe, min_train=min_train)
+        index.snapshot = os.path.basename(snapshot_path)
+        index.base = np.load(os.path.join(snapshot_path, "vectors.npy"), mmap_mode="r")
+        index.base_ids = np.load(os.path.join(snapshot_path, "ids.npy"), mmap_mode="r")
+        index.synced_at = datetime.fromisoformat(meta["synced_at"]) if meta["synced_at"] else None
+        if index.synced_at is not None and index.synced_at.tzinfo is not None:
+            # Snapshots gravados com fuso; o Mongo devolve UTC sem fuso.
+            index.synced_at = index.synced_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if os.path.exists(os.path.join(snapshot_path, "centroids.npy")):
+            index.centroids = np.load(os.path.join(snapshot_path, "centroids.npy"))
+            index.n_lists = len(index.centroids)
+            index.list_rows = np.load(os.path.join(snapshot_path, "list_rows.npy"), mmap_mode="r")
+            index.list_offsets = np.load(os.path.join(snapshot_path, "list_offsets.npy"))
+        return index
+
+
+class EmbeddingDeltaLog:
+    """Log binário append-only de codificações cadastradas depois do
+    snapshot. Cada registro tem tamanho fixo: o id (24 bytes ASCII) seguido
+    do vetor float32."""
+
+    def __init__(self, path, dim=128):
+        self.path = path
+        self.dim = dim
+        self.record_size = ID_LENGTH + dim * 4
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, user_id, vector):
+        record = str(user_id).encode("ascii").ljust(ID_LENGTH) + np.asarray(vector, dtype=np.float32).tobytes()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Com O_APPEND cada registro é gravado inteiro no fim do arquivo,
+        # mesmo com vários processos escrevendo.
+        file_descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(file_descriptor, record)
+        finally:
+            os.close(file_descriptor)
+
+    def read_from(self, offset):
+        end = offset + (self.size() - offset) // self.record_size * self.record_size
+        if end <= offset:
+            return [], np.empty((0, self.dim), dtype=np.float32), offset
+        with open(self.path, "rb") as log_file:
+            log_file.seek(offset)
+            data = log_file.read(end - offset)
+        records = np.frombuffer(
+            data, dtype=np.dtype([("id", f"S{ID_LENGTH}"), ("vector", np.float32, (self.dim,))])
+        )
+        ids = [user_id.decode("ascii").strip() for user_id in records["id"]]
+        return ids, records["vector"], end
+
+
+def benchmark(size=100000, queries=100, top_k=5, n_probes=(1, 4, 8, 16, 32), seed=0):
+    """Compara o índice IVF com a busca exata sobre codificações sintéticas,
+    retornando recall@top_k e latência média por consulta de cada n_probe."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, size // 50), 128)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=size)] + rng.normal(scale=0.3, size=(size, 128)).astype(np.float32)
+    probes = vectors[rng.choice(size, queries, replace=False)] + rng.normal(scale=0.05, size=(queries, 128)).astype(np.float32)
+
+    index = IVFFaceIndex(min_train=0)
+    started = time.perf_counter()
+    index.add([str(i) for i in range(size)], vectors)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    exact = [set(nearest_faces(probe, vectors, top_k)[0].astype(str)) for probe in probes]
+    results = [{"n_probe": "exato", "recall": 1.0, "ms_per_query": (time.perf_counter() - started) * 1000 / queries}]
+
+    for n_probe in n_probes:
+        started = time.perf_counter()
+        found = [set(index.search(probe, top_k, n_probe=n_probe)[0]) for probe in probes]
+        elapsed = time.perf_counter() - started
+        recall = sum(len(f & e) for f, e in zip(found, exact)) / (top_k * queries)
+        results.append({"n_probe": n_probe, "recall": recall, "ms_per_query": elapsed * 1000 / queries})
+    return build_seconds, results
@@ -1,40 +1,129 @@
 import face_recognition
+import hashlib
+import logging
+import multiprocessing
 import numpy as np
-import base64
+import resource
+from contextlib import contextmanager
 from io import BytesIO
+from bson.binary import Binary
 from PIL import Image
+from settings import settings
+from utils.exceptions import FaceNotDetected
+from utils.uploads import file_sha256
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def serialize_encoding(encoding):
+    return {
+        "vector": Binary(np.asarray(encoding, dtype=np.float32).tobytes()),
+        "model": settings.FACE_ENCODING_MODEL,
+    }
+
+
+def deserialize_encoding(face_encoding):
+    if not face_encoding or face_encoding.get("model") != settings.FACE_ENCODING_MODEL:
+        return None
+    return np.frombuffer(face_encoding["vector"], dtype=np.float32).astype(np.float64)
+
+
+def probe_cache_key(image):
+    """Chave do cache de probes: o hash do conteúdo da imagem (bytes ou
+    stream, sem ler o stream para a memória) mais a configuração que altera
+    a codificação calculada."""
+    if isinstance(image, (bytes, bytearray)):
+        digest = hashlib.sha256(image).hexdigest()
+    else:
+        digest = file_sha256(image)
+    return (
+        digest,
+        settings.FACE_ENCODING_MODEL,
+        settings.FACE_DETECTION_MODEL,
+        settings.FACE_UPSAMPLE,
+        settings.FACE_NUM_JITTERS,
+        settings.FACE_MAX_DIMENSION,
+    )
+
+
+@contextmanager
+def memory_report(label):
+    """Registra quanto o bloco elevou o pico de memória residente (RSS) do
+    processo, quando BIOMETRIC_MEMORY_REPORT está ligado.
+
+    O RSS inclui os buffers nativos do PIL e do dlib, que o tracemalloc não
+    vê. Como o pico é do processo inteiro, a medida só é feita nos processos
+    do pool biométrico, que executam um trabalho por vez; na própria
+    requisição (BIOMETRIC_WORKERS=0) outras threads se misturariam à conta.
+    Um aumento 0 significa que o bloco ficou abaixo de um pico anterior do
+    mesmo processo.
+    """
+    if not settings.BIOMETRIC_MEMORY_REPORT or multiprocessing.parent_process() is None:
+        yield
+        return
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        yield
+    finally:
+        # ru_maxrss é informado em KiB no Linux.
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        logger.info(f"{label}: pico de RSS {after / 1024:.2f} MiB (+{(after - before) / 1024:.2f} MiB)")
+
 
 class ValidateBiometric():
+    def load_image(self, image):
+        # Arquivos enviados são decodificados direto do stream; bytes vindos
+        # do banco são envolvidos em BytesIO sem cópia.
+        source = image if hasattr(image, "read") else BytesIO(image)
+        img = Image.open(source)
+
+        max_dimension = settings.FACE_MAX_DIMENSION
+        if max_dimension:
+            # Em JPEG, draft decodifica direto numa escala reduzida.
+            img.draft('RGB', (max_dimension, max_dimension))
+            img.thumbnail((max_dimension, max_dimension))
+
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # O dlib exige um array gravável, então a cópia de np.array é mantida.
+        return np.array(img)
+
+    def locate_largest_face(self, img_np):
+        locations = face_recognition.face_locations(
+            img_np,
+            number_of_times_to_upsample=settings.FACE_UPSAMPLE,
+            model=settings.FACE_DETECTION_MODEL
+        )
+        if not locations:
+            raise FaceNotDetected("Nenhum rosto encontrado na imagem.")
+        return max(locations, key=lambda location: (location[2] - location[0]) * (location[1] - location[3]))
+
+    def encode_face(self, image):
+        img_np = self.load_image(image)
+        location = self.locate_largest_face(img_np)
+        encodings = face_recognition.face_encodings(
+            img_np,
+            known_face_locations=[location],
+            num_jitters=settings.FACE_NUM_JITTERS
+        )
+        return encodings[0]
+
+    def validate_faces(self, inp_img, usr_img, usr_encoding=None, inp_encoding=None):
+        """Retorna `(válido, codificação do probe)`, para que quem chamou
+        possa reaproveitar a codificação."""
+        with memory_report("Validação biométrica"):
+            if usr_encoding is None:
+                usr_encoding = self.encode_face(usr_img)
+            if inp_encoding is None:
+                inp_encoding = self.encode_face(inp_img)
+
+        result = face_recognition.compare_faces(
+            [usr_encoding], inp_encoding, tolerance=settings.FACE_MATCH_TOLERANCE
+        )
 
-    def validate_faces(self, inp_img_b64, usr_img_b64):
-        file_contents = inp_img_b64.read()
-
-        inp_img_base64 = base64.b64encode(file_contents).decode('utf-8')
-        inp_img = Image.open(BytesIO(base64.b64decode(inp_img_base64)))
-        usr_img = Image.open(BytesIO(base64.b64decode(usr_img_b64)))
-
-        if usr_img is None or inp_img is None:
-            return False
-        
-        if inp_img.mode == 'RGBA':
-            inp_img = inp_img.convert('RGB')
-        elif inp_img.mode != 'RGB':
-            inp_img = inp_img.convert('RGB')
-
-        if usr_img.mode == 'RGBA':
-            usr_img = usr_img.convert('RGB')
-        elif usr_img.mode != 'RGB':
-            usr_img = usr_img.convert('RGB')
-            
-        usr_img_np = np.array(usr_img)
-        inp_img_np = np.array(inp_img)
-
-        usr_encoding = face_recognition.face_encodings(usr_img_np)[0]
-        inp_encoding = face_recognition.face_encodings(inp_img_np)[0]
-        
-        result = face_recognition.compare_faces([usr_encoding], inp_encoding)
-        
         if result[0]:
-            return True
-        
-        return False
+            return True, inp_encoding
+
+        return False, inp_encoding
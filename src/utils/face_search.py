@@ -0,0 +1,19 @@
+import numpy as np
+
+
+def nearest_faces(probe_encoding, encodings, top_k):
+    """Retorna os índices e as distâncias euclidianas das `top_k`
+    codificações mais próximas de `probe_encoding`, da menor para a maior.
+
+    `encodings` é uma matriz (N, 128); a comparação é feita de uma vez só.
+    """
+    if len(encodings) == 0 or top_k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    probe = np.asarray(probe_encoding, dtype=np.float32)
+    distances = np.linalg.norm(encodings - probe, axis=1)
+
+    top_k = min(top_k, len(distances))
+    indexes = np.argpartition(distances, top_k - 1)[:top_k]
+    indexes = indexes[np.argsort(distances[indexes])]
+    return indexes, distances[indexes]
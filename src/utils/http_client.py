@@ -0,0 +1,65 @@
+import logging
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from settings import settings
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class HttpClient:
+    """Sessões HTTP compartilhadas por host, com conexões keep-alive
+    reaproveitadas e timeouts padrão para as integrações externas."""
+    SESSIONS = {}
+    LOCK = threading.Lock()
+
+    @staticmethod
+    def _host(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    @staticmethod
+    def session(url):
+        host = HttpClient._host(url)
+        with HttpClient.LOCK:
+            if host not in HttpClient.SESSIONS:
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.HTTP_POOL_SIZE,
+                    pool_block=True
+                )
+                session = requests.Session()
+                session.mount(host, adapter)
+                HttpClient.SESSIONS[host] = session
+            return HttpClient.SESSIONS[host]
+
+    @staticmethod
+    def request(method, url, **kwargs):
+        kwargs.setdefault("timeout", (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+        return HttpClient.session(url).request(method, url, **kwargs)
+
+    @staticmethod
+    def get(url, **kwargs):
+        return HttpClient.request("GET", url, **kwargs)
+
+    @staticmethod
+    def post(url, **kwargs):
+        return HttpClient.request("POST", url, **kwargs)
+
+    @staticmethod
+    def preconnect(urls):
+        for url in urls:
+            try:
+                HttpClient.request("HEAD", HttpClient._host(url))
+                logger.info(f"Conexão aberta com {HttpClient._host(url)}")
+            except requests.RequestException as e:
+                logger.error(f"Não foi possível pré-conectar com {url}: {e}")
+
+    @staticmethod
+    def close():
+        with HttpClient.LOCK:
+            for session in HttpClient.SESSIONS.values():
+                session.close()
+            HttpClient.SESSIONS.clear()
@@ -1,9 +1,19 @@
 from datetime import datetime, timezone
+import base64
+import bcrypt
+import hashlib
+import hmac
 import random
 import string
+from settings import settings
 
 def default_datetime():
     return datetime.now().astimezone(timezone.utc)
+
+def file_bytes(file):
+    if file.get("data") is not None:
+        return bytes(file["data"])
+    return base64.b64decode(file["file_b64"])
     
 def validate_cnpj(cnpj):
     cnpj = ''.join(filter(str.isdigit, cnpj))
@@ -68,3 +78,27 @@ def generate_random_password():
     char = string.ascii_letters + string.digits + string.punctuation
     password = ''.join(random.choice(char) for _ in range(6))
     return password
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+def normalize_document(document):
+    return ''.join(filter(str.isdigit, document))
+
+def blind_index(value, normalize):
+    if not value:
+        return None
+    normalized_value = normalize(value).encode('utf-8')
+    key = settings.BLIND_INDEX_KEY.encode('utf-8')
+    return hmac.new(key, normalized_value, hashlib.sha256).hexdigest()
+
+def hash_password(password):
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+def is_password_hash(value):
+    return bool(value) and value.startswith(("$2a$", "$2b$", "$2y$"))
+
+def check_password(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
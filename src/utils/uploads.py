@@ -0,0 +1,151 @@
+import hashlib
+from tempfile import SpooledTemporaryFile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from settings import settings
+
+IMAGE_TYPES = ["jpg", "jpeg", "png"]
+
+# Assinaturas (magic bytes) aceitas por tipo de arquivo e o content type
+# gravado para ele. docx e zip compartilham a assinatura do zip.
+FILE_SIGNATURES = {
+    "png": ([b"\x89PNG\r\n\x1a\n"], "image/png"),
+    "jpg": ([b"\xff\xd8\xff"], "image/jpeg"),
+    "jpeg": ([b"\xff\xd8\xff"], "image/jpeg"),
+    "pdf": ([b"%PDF-"], "application/pdf"),
+    "doc": ([b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"], "application/msword"),
+    "docx": ([b"PK\x03\x04"], "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "xml": ([b"<?xml", b"\xef\xbb\xbf<?xml"], "application/xml"),
+    "zip": ([b"PK\x03\x04"], "application/zip"),
+}
+HASH_CHUNK_SIZE = 64 * 1024
+SIGNATURE_SIZE = max(len(signature) for signatures, _ in FILE_SIGNATURES.values() for signature in signatures)
+
+
+def detect_file_type(head, allowed_types):
+    """Retorna o primeiro tipo de `allowed_types` cuja assinatura corresponde
+    ao início do arquivo, ou None."""
+    for file_type in allowed_types:
+        signatures, _ = FILE_SIGNATURES[file_type]
+        if any(head.startswith(signature) for signature in signatures):
+            return file_type
+    return None
+
+
+def accepts_uploads(allowed_types=None, max_request_size=None, max_file_size=None):
+    """Declara na view os tipos de arquivo aceitos no multipart e, se
+    diferentes do padrão, os tamanhos máximos da requisição e de cada
+    arquivo. Views sem o decorator só têm o tamanho verificado."""
+    def decorator(view):
+        view.upload_types = allowed_types
+        view.max_request_size = max_request_size
+        view.max_file_size = max_file_size
+        return view
+    return decorator
+
+
+class UploadStream(SpooledTemporaryFile):
+    """Destino de um arquivo do multipart enquanto o corpo é lido.
+
+    Cada bloco recebido atualiza o sha256 e o tamanho; o arquivo fica em
+    memória até UPLOAD_SPOOL_THRESHOLD e depois vai para disco. O tipo é
+    verificado pelos magic bytes assim que o começo do arquivo chega, então
+    arquivos grandes demais ou de tipo errado são recusados sem ler o resto
+    da requisição.
+    """
+
+    def __init__(self, allowed_types=None, max_file_size=None):
+        super().__init__(max_size=settings.UPLOAD_SPOOL_THRESHOLD)
+        self.allowed_types = allowed_types
+        self.max_file_size = max_file_size or settings.UPLOAD_MAX_FILE_SIZE
+        self.size = 0
+        self.hash = hashlib.sha256()
+        self.head = b""
+        self.file_type = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_file_size:
+            raise RequestEntityTooLarge(f"O arquivo excede o tamanho máximo de {self.max_file_size} bytes.")
+        if self.allowed_types is not None and self.file_type is None:
+            self.head += data[:SIGNATURE_SIZE - len(self.head)]
+            if len(self.head) >= SIGNATURE_SIZE:
+                self.check_type()
+        self.hash.update(data)
+        return super().write(data)
+
+    def check_type(self):
+        if self.allowed_types is None or self.file_type is not None:
+            return
+        self.file_type = detect_file_type(self.head, self.allowed_types)
+        if self.file_type is None:
+            raise UnsupportedMediaType(f"Tipo de arquivo não suportado. Tipos aceitos: {', '.join(self.allowed_types)}.")
+
+    @property
+    def sha256(self):
+        return self.hash.hexdigest()
+
+    @property
+    def content_type(self):
+        if self.file_type is None:
+            return None
+        return FILE_SIGNATURES[self.file_type][1]
+
+
+class UploadRequest(Request):
+    """Request que grava os arquivos do multipart em UploadStream."""
+
+    def _upload_view(self):
+        if self.url_rule is None:
+            return None
+        return current_app.view_functions.get(self.endpoint)
+
+    @property
+    def max_content_length(self):
+        max_request_size = getattr(self._upload_view(), "max_request_size", None)
+        return max_request_size or super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        view = self._upload_view()
+        return UploadStream(getattr(view, "upload_types", None), getattr(view, "max_file_size", None))
+
+    def _load_form_data(self):
+        super()._load_form_data()
+        # Arquivos menores que a maior assinatura só são verificados aqui.
+        for _, file in self.files.items(multi=True):
+            if isinstance(file.stream, UploadStream):
+                file.stream.check_type()
+
+
+def file_sha256(file):
+    """sha256 de um arquivo enviado sem carregá-lo inteiro. Um UploadStream
+    já tem o hash calculado na leitura do multipart; outros streams são lidos
+    em blocos e voltam à posição original."""
+    stream = getattr(file, "stream", file)
+    if isinstance(stream, UploadStream):
+        return stream.sha256
+    digest = hashlib.sha256()
+    position = stream.tell()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(position)
+    return digest.hexdigest()
+
+
+def read_upload(file):
+    """Lê o arquivo enviado e retorna o dict gravado no banco. O conteúdo
+    é lido uma única vez do UploadStream, já limitado pelo tamanho máximo
+    de arquivo da view."""
+    stream = file.stream
+    data = file.read()
+    if isinstance(stream, UploadStream):
+        return {
+            "data": data,
+            "content_type": stream.content_type or file.content_type,
+            "sha256": stream.sha256,
+        }
+    return {
+        "data": data,
+        "content_type": file.content_type,
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
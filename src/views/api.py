@@ -1,11 +1,18 @@
 import logging
-from flask import Blueprint, request, jsonify
+import zipfile
+from io import BytesIO
+from flask import Blueprint, request, jsonify, send_file
 from marshmallow import ValidationError
 from schemas import DocumentSchema, ExpensesSchema, UserSchema, LoginSchema, BiometricSchema
 from controllers.user_controller import UserController
+from controllers.biometric_job_controller import BiometricJobController
+from controllers.crypt_controller import CryptController
+from settings import settings
 from flask_cors import CORS
 from controllers.expenses_controller import ExpensesController
-from utils.exceptions import BiometricsNotFound, BiometricsNotValid, ExpensesException, LoginException, UserAlreadyExistsException, UserNotFound
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from utils.uploads import FILE_SIGNATURES, IMAGE_TYPES, SIGNATURE_SIZE, accepts_uploads, detect_file_type
+from utils.exceptions import BiometricJobNotFound, BiometricsBusy, BiometricsNotFound, BiometricsNotValid, BiometricsTimeout, DocumentNotFound, ExpensesException, FaceNotDetected, FileTooLarge, LoginException, UnsupportedFileType, UserAlreadyExistsException, UserNotFound, biometric_error_status
 
 bp = Blueprint("user", __name__)
 
@@ -19,9 +26,34 @@ def add_cors_headers(response):
     response.headers.add("Access-Control-Allow-Headers", "Content-Type, Access-Control-Allow-Origin, Authorization")
     return response
 
+@bp.before_request
+def parse_uploads():
+    # Lê o multipart antes da view: arquivos grandes demais ou de tipo não
+    # aceito interrompem a leitura do corpo e caem nos handlers abaixo.
+    if request.mimetype == "multipart/form-data":
+        request.files
+
+@bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    message = e.description
+    if message == RequestEntityTooLarge.description:
+        message = "A requisição excede o tamanho máximo permitido."
+    logger.error(f"Error: {message}")
+    return jsonify({"status": 413, "message": message}), 413
+
+@bp.errorhandler(UnsupportedMediaType)
+def upload_unsupported(e):
+    logger.error(f"Error: {e.description}")
+    return jsonify({"status": 415, "message": e.description}), 415
+
 @bp.route("/health", methods=["GET"])
 def health_check():
-    return jsonify({"status": "ok", "message": "Service is healthy"})
+    caches = {
+        "decrypt": CryptController.decrypt_cache_stats(),
+        "biometric_reference": UserController.reference_cache_stats(),
+        "biometric_probe": UserController.probe_cache_stats()
+    }
+    return jsonify({"status": "ok", "message": "Service is healthy", "caches": caches})
 
 @bp.route("/create", methods=["POST"])
 def create_user():
@@ -44,9 +76,19 @@ def create_user():
 @bp.route("/user/<user_id>", methods=["GET"])
 def get_user(user_id):
     try:
-        user = UserController.find_user_by_id(user_id)
+        fields = request.args.get("fields")
+        if fields is not None:
+            fields = [field.strip() for field in fields.split(",") if field.strip()]
+            invalid_fields = [field for field in fields if field not in UserController.USER_FIELDS]
+            if not fields or invalid_fields:
+                raise ValidationError(f"Campos inválidos: {', '.join(invalid_fields)}")
+
+        user = UserController.find_user_by_id(user_id, fields=fields)
 
         return user
+    except ValidationError as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 422, "message": str(e)}), 422
     except UserNotFound as e:
         logger.error(f"Error: {str(e)}")
         return jsonify({"status": 404, "message": str(e)}), 404
@@ -88,6 +130,7 @@ def get_biometry_status(user_id):
         return jsonify({"status": 400, "message": str(e)}), 400
 
 @bp.route("/send_biometry/<user_id>", methods=["PUT"])
+@accepts_uploads(IMAGE_TYPES)
 def send_biometry(user_id):
     try:
         file = request.files.get("file")
@@ -119,6 +162,7 @@ def send_biometry(user_id):
         return jsonify({"status": 400, "message": str(e)}), 400
     
 @bp.route("/documents/<user_id>", methods=["PUT"])
+@accepts_uploads(settings.VALID_DOCUMENTS_EXTENSIONS)
 def send_documents(user_id):
     try:
         document_type = request.form.get("document_type")
@@ -148,6 +192,127 @@ def send_documents(user_id):
         logger.error(f"Error: {str(e)}")
         return jsonify({"status": 400, "message": str(e)}), 400
     
+@bp.route("/documents/<user_id>/<document_id>", methods=["GET"])
+def download_document(user_id, document_id):
+    try:
+        document = UserController.get_document(user_id, document_id)
+
+        # Documentos não mudam depois de enviados, então o id serve de ETag;
+        # send_file responde 304 e requisições com Range.
+        response = send_file(
+            BytesIO(document["data"]),
+            mimetype=document["content_type"],
+            conditional=True,
+            etag=document["document_id"]
+        )
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    except DocumentNotFound as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 404, "message": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 400, "message": str(e)}), 400
+    
+@bp.route("/biometrics/identify", methods=["POST"])
+def identify_biometrics():
+    try:
+        image = request.files.get("file")
+        top_k = request.form.get("top_k", str(settings.IDENTIFY_TOP_K))
+
+        if not image:
+            raise ValidationError("A imagem é obrigatória.")
+        if not top_k.isdigit() or not 1 <= int(top_k) <= settings.IDENTIFY_MAX_TOP_K:
+            raise ValidationError(f"top_k deve ser um número entre 1 e {settings.IDENTIFY_MAX_TOP_K}.")
+
+        matches = UserController.identify_biometric(image, int(top_k))
+
+        return jsonify({"status": "success", "matches": matches})
+    except (ValidationError, FaceNotDetected) as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 422, "message": str(e)}), 422
+    except BiometricsBusy as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 503, "message": str(e)}), 503
+    except BiometricsTimeout as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 504, "message": str(e)}), 504
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 400, "message": str(e)}), 400
+    
+def _batch_item_error(e):
+    return {"status": biometric_error_status(e), "message": str(e)}
+
+@bp.route("/biometrics/batch", methods=["POST"])
+def validate_biometrics_batch():
+    try:
+        user_ids = request.form.getlist("user_id")
+        images = request.files.getlist("file")
+        is_from_partner = request.form.get("integration", "False")
+        is_from_partner = is_from_partner.lower()
+
+        if not user_ids or len(user_ids) != len(images):
+            raise ValidationError("Cada user_id deve ser enviado com uma imagem.")
+        if len(user_ids) > settings.BIOMETRIC_BATCH_MAX_SIZE:
+            raise ValidationError(f"O lote aceita no máximo {settings.BIOMETRIC_BATCH_MAX_SIZE} biometrias.")
+
+        results = UserController.validate_biometrics_batch(list(zip(user_ids, images)), is_from_partner)
+
+        items = []
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error: {user_id}: {str(result)}")
+                items.append({"user_id": user_id, **_batch_item_error(result)})
+            else:
+                items.append({"user_id": user_id, "status": "success", **result})
+        return jsonify({"status": "success", "results": items})
+    except ValidationError as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 422, "message": str(e)}), 422
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 400, "message": str(e)}), 400
+    
+@bp.route("/biometrics/<user_id>/jobs", methods=["POST"])
+def create_biometrics_job(user_id):
+    try:
+        image = request.files.get("file")
+        is_from_partner = request.form.get("integration", "False")
+        is_from_partner = is_from_partner.lower()
+        callback_url = request.form.get("callback_url")
+
+        if not image:
+            raise ValidationError("A imagem é obrigatória.")
+        if callback_url and not BiometricJobController.callback_allowed(callback_url):
+            raise ValidationError("callback_url não permitido.")
+
+        job_id = BiometricJobController.submit(image, user_id, is_from_partner, callback_url)
+
+        return jsonify({"status": "success", "message": "Validação biométrica agendada.", "job_id": str(job_id)}), 202
+    except ValidationError as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 422, "message": str(e)}), 422
+    except BiometricsBusy as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 503, "message": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 400, "message": str(e)}), 400
+
+@bp.route("/biometrics/jobs/<job_id>", methods=["GET"])
+def get_biometrics_job(job_id):
+    try:
+        job = BiometricJobController.find_job(job_id)
+
+        return jsonify({"status": "success", "job": job})
+    except BiometricJobNotFound as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 404, "message": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 400, "message": str(e)}), 400
+
 @bp.route("/biometrics/<user_id>", methods=["POST"])
 def validate_biometrics(user_id):
     try:
@@ -169,6 +334,15 @@ def validate_biometrics(user_id):
     except (BiometricsNotFound, UserNotFound) as e:
         logger.error(f"Error: {str(e)}")
         return jsonify({"status": 404, "message": str(e)}), 404
+    except FaceNotDetected as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 422, "message": str(e)}), 422
+    except BiometricsBusy as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 503, "message": str(e)}), 503
+    except BiometricsTimeout as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 504, "message": str(e)}), 504
     except (BiometricsNotValid, Exception) as e:
         logger.error(f"Error: {str(e)}")
         return jsonify({"status": 400, "message": str(e)}), 400
@@ -208,6 +382,7 @@ def update_balance(user_id):
         return jsonify({"status": 400, "message": str(e)}), 400
     
 @bp.route("/send_biometry", methods=["POST"])
+@accepts_uploads(IMAGE_TYPES)
 def create_biometriy_for_partner():
     try:
         file = request.files.get("file")
@@ -232,6 +407,67 @@ def create_biometriy_for_partner():
         logger.error(f"Error: {str(e)}")
         return jsonify({"status": 400, "message": str(e)}), 400
     
+def _bulk_images(files, archive):
+    for file in files:
+        yield (file.filename, *_bulk_image(file.stream.size, file.stream))
+    if archive:
+        # O arquivo enviado já está em disco/memória temporária do Werkzeug;
+        # os membros do zip são lidos um a um, conforme o lote avança.
+        with zipfile.ZipFile(archive.stream) as zip_file:
+            for member in zip_file.infolist():
+                if member.is_dir():
+                    continue
+                with zip_file.open(member) as member_file:
+                    image = _bulk_image(member.file_size, member_file)
+                yield (member.filename, *image)
+
+def _bulk_image(size, stream):
+    # Cada imagem do lote tem o limite de UPLOAD_MAX_FILE_SIZE, mesmo com o
+    # zip aceito até o limite do lote. O tamanho declarado no zip pode ser
+    # falso, então a leitura também é limitada, para que um membro pequeno
+    # comprimido não se expanda em memória.
+    too_large = FileTooLarge(f"O arquivo excede o tamanho máximo de {settings.UPLOAD_MAX_FILE_SIZE} bytes.")
+    if size > settings.UPLOAD_MAX_FILE_SIZE:
+        return None, too_large
+    data = stream.read(settings.UPLOAD_MAX_FILE_SIZE + 1)
+    if len(data) > settings.UPLOAD_MAX_FILE_SIZE:
+        return None, too_large
+    file_type = detect_file_type(data[:SIGNATURE_SIZE], IMAGE_TYPES)
+    if file_type is None:
+        return None, UnsupportedFileType(f"Tipo de arquivo não suportado. Tipos aceitos: {', '.join(IMAGE_TYPES)}.")
+    return FILE_SIGNATURES[file_type][1], data
+
+@bp.route("/send_biometry/bulk", methods=["POST"])
+@accepts_uploads(
+    IMAGE_TYPES + ["zip"],
+    max_request_size=settings.UPLOAD_MAX_BULK_REQUEST_SIZE,
+    max_file_size=settings.UPLOAD_MAX_BULK_REQUEST_SIZE
+)
+def create_biometrics_for_partner_bulk():
+    try:
+        files = request.files.getlist("file")
+        archive = request.files.get("archive")
+
+        if not files and not archive:
+            raise ValidationError("É necessário fornecer arquivos ou um arquivo zip.")
+        if archive and not zipfile.is_zipfile(archive.stream):
+            raise ValidationError("O arquivo enviado não é um zip válido.")
+
+        created, failures = UserController.save_biometrics_for_partner_bulk(_bulk_images(files, archive))
+
+        errors = []
+        for failure in failures:
+            error = failure.pop("error")
+            logger.error(f"Error: {failure['filename']}: {str(error)}")
+            errors.append({**failure, **_batch_item_error(error)})
+        return jsonify({"status": "success", "created": created, "failures": errors})
+    except ValidationError as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 422, "message": str(e)}), 422
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        return jsonify({"status": 400, "message": str(e)}), 400
+
 @bp.route("/expense/<user_id>", methods=["POST"])
 def create_expense(user_id):
     try: